@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
     'core',
     'rest_framework',
@@ -56,6 +59,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -148,8 +152,63 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Per-user cache versions must be shared by every uwsgi worker, or a
+# write in one worker leaves the others serving stale responses.
+if not DEBUG and CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    raise ImproperlyConfigured(
+        'CACHE_BACKEND must be a shared cache such as memcached unless '
+        'DEBUG is on.'
+    )
+
+# Per-user recipe response cache: shared backend timeout (seconds) and
+# number of entries kept in each process's in-memory LRU tier.
+RECIPE_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300))
+RECIPE_CACHE_LRU_SIZE = int(os.environ.get('RECIPE_CACHE_LRU_SIZE', 1024))
+
+# Maximum number of SQL queries a single request may run (0 disables).
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 0))
+
+# Threads rendering responsive variants of uploaded recipe images off the
+# request thread (0 renders them inline after the upload commits).
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))
+
+# Resumable image uploads: largest accepted image (bytes), seconds an
+# unfinished upload session may be resumed for and unfinished sessions a
+# user may hold at once.
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_SIZE', 50 * 1024 * 1024)
+)
+IMAGE_UPLOAD_EXPIRY = int(os.environ.get('IMAGE_UPLOAD_EXPIRY', 24 * 3600))
+IMAGE_UPLOAD_MAX_ACTIVE = int(os.environ.get('IMAGE_UPLOAD_MAX_ACTIVE', 5))
+
+# Delta sync: rows of each kind per page and days tombstones are kept,
+# older sync tokens need a full resync.
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(
+    os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30)
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -0,0 +1,222 @@
+"""
+Django command to benchmark the recipe API hot paths.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    SimilarityBucket,
+)
+from core.similarity import (
+    estimate_similarity,
+    update_similarity_signatures,
+)
+from core.usage import recipe_ingredient_count
+from recipe.filters import filter_related, rank_by_pantry, similar_recipes
+from recipe.serializers import (
+    RecipeSerializer,
+    RecipeDetailSerializer,
+    RecipeReadSerializer,
+    RecipeDetailReadSerializer,
+)
+
+
+class Command(BaseCommand):
+    """Benchmark recipe queries on throwaway data rolled back afterwards."""
+
+    suites = ['filters', 'serializers', 'pantry', 'similar']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'suite', nargs='?', choices=self.suites, default='filters',
+        )
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--vocabulary', type=int, default=200)
+        parser.add_argument('--links', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.rng = random.Random(options['seed'])
+        self.repeat = options['repeat']
+        with transaction.atomic():
+            user = self._create_dataset(options)
+            getattr(self, f'_bench_{options["suite"]}')(user)
+            transaction.set_rollback(True)
+
+    def _create_dataset(self, options):
+        """Create a user with linked recipes, tags and ingredients."""
+        user = get_user_model().objects.create_user(
+            email=f'benchmark-{self.rng.random()}@example.com',
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'Tag {i}')
+            for i in range(options['vocabulary'])
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'Ingredient {i}')
+            for i in range(options['vocabulary'])
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=self.rng.randint(5, 120),
+                price=Decimal(self.rng.randint(100, 5000)) / 100,
+            )
+            for i in range(options['recipes'])
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(user=user).values_list('id', flat=True)
+        )
+        tag_ids = [tag.id for tag in Tag.objects.filter(user=user)]
+        ingredient_ids = [
+            ingredient.id for ingredient in Ingredient.objects.filter(
+                user=user,
+            )
+        ]
+        links = min(options['links'], len(tags), len(ingredients))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.rng.sample(tag_ids, links)
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.rng.sample(ingredient_ids, links)
+        )
+        Recipe.objects.filter(user=user).update(
+            ingredient_count=recipe_ingredient_count(Recipe),
+        )
+        # Plans should see the new rows, as they would on a live database.
+        with connection.cursor() as cursor:
+            for model in (Recipe, Tag, Ingredient):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+            for through in (Recipe.tags.through, Recipe.ingredients.through):
+                cursor.execute(f'ANALYZE {through._meta.db_table}')
+        self.tag_ids = tag_ids
+        self.ingredient_ids = ingredient_ids
+        self.stdout.write(
+            f'Dataset: {len(recipe_ids)} recipes, {len(tag_ids)} tags, '
+            f'{links} links per relation.'
+        )
+
+        return user
+
+    def _time(self, label, queryset):
+        """Report the best wall time of evaluating a queryset."""
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            rows = len(list(queryset.values_list('id', flat=True)))
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(
+            f'  {label:<28} {min(timings) * 1000:9.2f} ms  {rows} rows'
+        )
+
+    def _bench_filters(self, user):
+        """Compare join+DISTINCT tag filtering with the EXISTS filters."""
+        base = Recipe.objects.filter(user=user).order_by('-id')
+        for size in (1, 3, 10):
+            ids = self.rng.sample(self.tag_ids, size)
+            self.stdout.write(f'Filtering on {size} tag(s):')
+            self._time(
+                'any (join + distinct)',
+                base.filter(tags__id__in=ids).distinct(),
+            )
+            for mode in ('any', 'all', 'none'):
+                self._time(
+                    f'{mode} (exists)',
+                    filter_related(base, 'tags', ids, mode),
+                )
+
+    def _bench_serializers(self, user):
+        """Compare per-row cost of the model and planned read serializers."""
+        recipes = list(
+            Recipe.objects.filter(user=user).prefetch_related(
+                'tags', 'ingredients',
+            ).order_by('-id')
+        )
+        pairs = [
+            ('list', RecipeSerializer, RecipeReadSerializer),
+            ('detail', RecipeDetailSerializer, RecipeDetailReadSerializer),
+        ]
+        for size in (1000, 10000):
+            rows = recipes[:size]
+            self.stdout.write(f'Serializing {len(rows)} recipes:')
+            for label, *serializer_classes in pairs:
+                for serializer_class in serializer_classes:
+                    timings = []
+                    for _ in range(self.repeat):
+                        start = time.perf_counter()
+                        serializer_class(rows, many=True).data
+                        timings.append(time.perf_counter() - start)
+                    self.stdout.write(
+                        f'  {label:<7} {serializer_class.__name__:<28} '
+                        f'{min(timings) / len(rows) * 1e6:8.2f} us/row'
+                    )
+
+    def _bench_pantry(self, user):
+        """Time pantry ranking for growing pantries."""
+        base = Recipe.objects.filter(user=user)
+        for size in (5, 20, 50):
+            ids = self.rng.sample(
+                self.ingredient_ids, min(size, len(self.ingredient_ids)),
+            )
+            self._time(f'pantry of {len(ids)}', rank_by_pantry(base, ids)[:50])
+
+    def _bench_similar(self, user):
+        """Compare LSH similar recipe lookups with a scan of all recipes."""
+        base = Recipe.objects.filter(user=user)
+        start = time.perf_counter()
+        update_similarity_signatures(base)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Signatures: {base.count() / elapsed:.0f} recipes/s'
+        )
+        with connection.cursor() as cursor:
+            for model in (Recipe, SimilarityBucket):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        for recipe in self.rng.sample(list(base), 3):
+            self.stdout.write(f'Similar to recipe {recipe.id}:')
+            for label, lookup in [
+                ('lsh', self._similar_lsh),
+                ('scan', self._similar_scan),
+            ]:
+                timings = []
+                for _ in range(self.repeat):
+                    start = time.perf_counter()
+                    rows = lookup(base, recipe)
+                    timings.append(time.perf_counter() - start)
+                self.stdout.write(
+                    f'  {label:<28} {min(timings) * 1000:9.2f} ms  '
+                    f'{rows} rows'
+                )
+
+    def _similar_lsh(self, base, recipe):
+        return len(similar_recipes(base, recipe))
+
+    def _similar_scan(self, base, recipe):
+        scores = sorted(
+            (
+                estimate_similarity(recipe.minhash, minhash)
+                for minhash in base.exclude(pk=recipe.pk).values_list(
+                    'minhash', flat=True,
+                )
+            ),
+            reverse=True,
+        )
+        return len(scores[:10])
@@ -0,0 +1,17 @@
+"""
+Django command to remove expired resumable image uploads
+"""
+from django.core.management.base import BaseCommand
+
+from recipe.uploads import remove_expired_uploads
+
+
+class Command(BaseCommand):
+    """Django command to remove expired upload sessions and part files."""
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        sessions, files = remove_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {sessions} expired uploads and {files} stray files.'
+        ))
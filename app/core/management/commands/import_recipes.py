@@ -0,0 +1,308 @@
+"""
+Django command to bulk import recipes from NDJSON or CSV files.
+"""
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+
+from core.models import (
+    ImportCheckpoint,
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from core.search import update_search_vectors
+from core.similarity import update_similarity_signatures
+from core.usage import recipe_ingredient_count, update_recipe_counts
+from recipe.cache import response_cache
+
+
+RECIPE_FIELDS = ['title', 'description', 'time_minutes', 'price', 'link']
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+class Command(BaseCommand):
+    """Import recipes with COPY into staging tables and set-based SQL.
+
+    Every batch is one transaction: rows are validated in Python, copied
+    into temporary staging tables, then tags and ingredients are upserted,
+    recipes inserted and links created with one statement each. The number
+    of consumed records is saved to an ImportCheckpoint row in the same
+    transaction as the batch, so an interrupted import resumes right after
+    the last committed batch and never writes a batch twice.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Owner email.')
+        parser.add_argument('--format', choices=['ndjson', 'csv'])
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint name, defaults to the absolute path.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore an existing checkpoint and start over.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if connection.vendor != 'postgresql':
+            raise CommandError('import_recipes requires PostgreSQL.')
+        try:
+            self.user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["user"]}.')
+
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson'
+        )
+        checkpoint = options['checkpoint'] or os.path.abspath(path)
+        if options['restart']:
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        done = self._read_checkpoint(checkpoint, path)
+        if done:
+            self.stdout.write(f'Resuming after {done} records.')
+
+        imported = skipped = 0
+        start = time.monotonic()
+        with open(path, newline='') as stream:
+            records = islice(self._read_records(stream, fmt), done, None)
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+
+                rows, links = self._parse_batch(batch, done)
+                with transaction.atomic():
+                    if rows:
+                        self._import_batch(rows, links)
+                    done += len(batch)
+                    self._write_checkpoint(checkpoint, path, done)
+                imported += len(rows)
+                skipped += len(batch) - len(rows)
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f'{done} records processed, {imported} imported, '
+                    f'{skipped} skipped ({imported / elapsed:.0f} '
+                    f'recipes/s).'
+                )
+
+        ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, skipped {skipped}.'
+        ))
+
+    def _read_checkpoint(self, checkpoint, path):
+        """Return the number of records already imported from path."""
+        state = ImportCheckpoint.objects.filter(name=checkpoint).first()
+        if state is None:
+            return 0
+        if state.path != os.path.abspath(path):
+            raise CommandError(
+                f'Checkpoint {checkpoint} belongs to {state.path}, '
+                f'use --restart to ignore it.'
+            )
+
+        return state.records
+
+    def _write_checkpoint(self, checkpoint, path, records):
+        """Record the number of consumed records in the batch transaction."""
+        ImportCheckpoint.objects.update_or_create(
+            name=checkpoint,
+            defaults={'path': os.path.abspath(path), 'records': records},
+        )
+
+    def _read_records(self, stream, fmt):
+        """Yield one dict per record, with relations as lists of names.
+
+        CSV relation columns hold a JSON array of names, as exported.
+        """
+        if fmt == 'csv':
+            for record in csv.DictReader(stream):
+                try:
+                    for relation in RELATIONS:
+                        names = json.loads(record.get(relation) or '[]')
+                        if not isinstance(names, list):
+                            raise ValueError(relation)
+                        record[relation] = names
+                except ValueError:
+                    yield None
+                    continue
+                yield record
+            return
+
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            if not isinstance(record, dict):
+                yield None
+                continue
+            for relation in RELATIONS:
+                record[relation] = record.get(relation) or []
+            yield record
+
+    def _value(self, record, name):
+        value = record.get(name)
+        return '' if value is None else value
+
+    def _name(self, item):
+        """Return the name of a tag or ingredient given as text or object."""
+        if not isinstance(item, dict):
+            return item
+        if 'name' not in item:
+            raise ValidationError('Tags and ingredients need a name.')
+
+        return item['name']
+
+    def _parse_batch(self, batch, offset):
+        """Validate records, returning recipe rows and link rows."""
+        fields = {name: Recipe._meta.get_field(name) for name in RECIPE_FIELDS}
+        name_fields = {
+            relation: model._meta.get_field('name')
+            for relation, model in RELATIONS.items()
+        }
+        rows, links = [], []
+        for number, record in enumerate(batch, start=offset + 1):
+            try:
+                if record is None:
+                    raise ValidationError('Malformed record.')
+                row = [number] + [
+                    field.clean(self._value(record, name), None)
+                    for name, field in fields.items()
+                ]
+                row_links = [
+                    (number, relation, name_fields[relation].clean(
+                        self._name(item), None,
+                    ))
+                    for relation in RELATIONS
+                    for item in record[relation]
+                ]
+            except (ValidationError, TypeError) as error:
+                self.stderr.write(f'Record {number} skipped: {error}')
+                continue
+            rows.append(row)
+            links.extend(row_links)
+
+        return rows, links
+
+    def _copy(self, cursor, table, columns, rows):
+        """Stream rows into a table with COPY."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH CSV',
+            buffer,
+        )
+
+    def _import_batch(self, rows, links):
+        """Write one batch of validated rows with set-based statements.
+
+        Runs in the caller's transaction, which also saves the checkpoint.
+        """
+        recipe_table = Recipe._meta.db_table
+        user_id = self.user.id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DROP TABLE IF EXISTS import_recipe, import_link;'
+                'CREATE TEMP TABLE import_recipe ('
+                ' line bigint, id bigint, title text, description text,'
+                ' time_minutes integer, price numeric(5, 2), link text'
+                ') ON COMMIT DROP;'
+                'CREATE TEMP TABLE import_link ('
+                ' line bigint, relation text, name text'
+                ') ON COMMIT DROP;'
+            )
+            self._copy(
+                cursor, 'import_recipe', ['line'] + RECIPE_FIELDS, rows,
+            )
+            self._copy(
+                cursor, 'import_link', ['line', 'relation', 'name'], links,
+            )
+            cursor.execute(
+                f"UPDATE import_recipe SET id = nextval("
+                f"pg_get_serial_sequence('{recipe_table}', 'id'))"
+            )
+
+            for relation, model in RELATIONS.items():
+                table = model._meta.db_table
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    f'(user_id, name, updated_at, recipe_count) '
+                    f'SELECT DISTINCT ON (lower(name)) %s, name, now(), 0 '
+                    f'FROM import_link WHERE relation = %s '
+                    f'ORDER BY lower(name), line '
+                    f'ON CONFLICT (user_id, lower(name)) DO NOTHING',
+                    [user_id, relation],
+                )
+
+            # COPY reads empty CSV values as NULL, blank text is wanted.
+            cursor.execute(
+                f'INSERT INTO {recipe_table} '
+                f'(id, user_id, title, description, time_minutes, price, '
+                f'link, updated_at, ingredient_count, image_variants, '
+                f'image_variants_failed) '
+                f"SELECT id, %s, title, COALESCE(description, ''), "
+                f"time_minutes, price, COALESCE(link, ''), now(), 0, "
+                f"'[]', false "
+                f'FROM import_recipe',
+                [user_id],
+            )
+
+            for relation, model in RELATIONS.items():
+                through = getattr(Recipe, relation).through
+                column = f'{model._meta.model_name}_id'
+                cursor.execute(
+                    f'INSERT INTO {through._meta.db_table} '
+                    f'(recipe_id, {column}) '
+                    f'SELECT DISTINCT r.id, t.id FROM import_link l '
+                    f'JOIN import_recipe r ON r.line = l.line '
+                    f'JOIN {model._meta.db_table} t '
+                    f'ON t.user_id = %s AND lower(t.name) = lower(l.name) '
+                    f'WHERE l.relation = %s',
+                    [user_id, relation],
+                )
+
+        recipes = Recipe.objects.filter(
+            id__in=RawSQL('SELECT id FROM import_recipe', []),
+        )
+        update_search_vectors(
+            recipes,
+            ingredient_count=recipe_ingredient_count(Recipe),
+        )
+        update_similarity_signatures(recipes)
+        for relation, model in RELATIONS.items():
+            update_recipe_counts(
+                model.objects.alias(lower_name=Lower('name')).filter(
+                    user=self.user,
+                    lower_name__in=RawSQL(
+                        'SELECT lower(name) FROM import_link '
+                        'WHERE relation = %s',
+                        [relation],
+                    ),
+                ),
+                getattr(Recipe, relation).through,
+            )
+        # now() is the start of the batch transaction, which may be longer
+        # ago than the sync lag by commit time; restamp with the wall clock
+        # so sync clients that synced meanwhile still see these recipes.
+        recipes.update(updated_at=RawSQL('clock_timestamp()', []))
+        response_cache.invalidate(user_id)
@@ -0,0 +1,17 @@
+"""
+Django command to delete tombstones past the sync retention
+"""
+from django.core.management.base import BaseCommand
+
+from recipe.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    """Django command to delete tombstones older than the retention."""
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired tombstones.'
+        ))
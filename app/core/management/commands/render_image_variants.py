@@ -0,0 +1,47 @@
+"""
+Django command to render missing recipe image variants
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Recipe
+from recipe.images import generate_image_variants, record_variants_failed
+
+
+class Command(BaseCommand):
+    """Render the variants of recipe images that have none.
+
+    Variants are generated in a thread pool after the upload commits, so
+    work queued when a worker stops is lost; this picks it up again.
+    Images that fail are marked and skipped by later runs unless
+    --retry-failed is given.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Also retry images whose variants failed before.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        # Images uploaded from now on are rendered by the app's workers.
+        recipes = Recipe.objects.exclude(image='').filter(
+            image_variants=[], updated_at__lt=timezone.now(),
+        )
+        if not options['retry_failed']:
+            recipes = recipes.filter(image_variants_failed=False)
+        rendered = failed = 0
+        for recipe_id, name in recipes.values_list(
+            'id', 'image',
+        ).order_by('id').iterator():
+            try:
+                generate_image_variants(recipe_id, name)
+                rendered += 1
+            except Exception as error:
+                failed += 1
+                record_variants_failed(recipe_id, name)
+                self.stderr.write(f'Recipe {recipe_id}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered variants of {rendered} images, {failed} failed.'
+        ))
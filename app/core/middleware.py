@@ -0,0 +1,90 @@
+"""
+Middleware for the app.
+"""
+from contextlib import contextmanager, ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a block of code runs more SQL queries than allowed."""
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries it sees."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL queries the wrapped block runs on any connection."""
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+def check_budget(counter, limit, label):
+    """Raise if a counter saw more than `limit` queries."""
+    if counter.count > limit:
+        raise QueryBudgetExceeded(
+            f'{label} ran {counter.count} queries, budget is {limit}.'
+        )
+
+
+@contextmanager
+def query_budget(limit, label='block'):
+    """Fail if the wrapped block runs more than `limit` SQL queries."""
+    with count_queries() as counter:
+        yield counter
+
+    check_budget(counter, limit, label)
+
+
+def view_query_budget(view_func, method):
+    """Return the budget a view declares for a request method, if any.
+
+    Views declare `query_budgets`, a mapping of viewset action (or
+    lowercase method for plain views) to the most queries it may run.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    budgets = getattr(view_class, 'query_budgets', None)
+    if not budgets:
+        return None
+    actions = getattr(view_func, 'actions', None) or {}
+
+    return budgets.get(actions.get(method.lower(), method.lower()))
+
+
+class QueryBudgetMiddleware:
+    """Fail requests that run more queries than their budget.
+
+    A view's own `query_budgets` entry applies wherever it is declared,
+    other requests fall back to settings.QUERY_BUDGET (0 disables it).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with count_queries() as counter:
+            response = self.get_response(request)
+
+        limit = getattr(request, 'query_budget', None)
+        if limit is None:
+            limit = getattr(settings, 'QUERY_BUDGET', 0)
+        if limit:
+            check_budget(counter, limit, f'{request.method} {request.path}')
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = view_query_budget(view_func, request.method)
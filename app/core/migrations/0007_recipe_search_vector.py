@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:59
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def populate_search_vectors(apps, schema_editor):
+    """Compute search vectors for existing recipes."""
+    Recipe = apps.get_model('core', 'Recipe')
+    Tag = apps.get_model('core', 'Tag')
+    Ingredient = apps.get_model('core', 'Ingredient')
+    linked_names = (
+        "coalesce((SELECT string_agg(n.name, ' ') FROM {link} l "
+        "JOIN {table} n ON n.id = l.{column} WHERE l.recipe_id = r.id), '')"
+    )
+    tag_names = linked_names.format(
+        link=Recipe.tags.through._meta.db_table,
+        table=Tag._meta.db_table,
+        column='tag_id',
+    )
+    ingredient_names = linked_names.format(
+        link=Recipe.ingredients.through._meta.db_table,
+        table=Ingredient._meta.db_table,
+        column='ingredient_id',
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Recipe._meta.db_table} r SET search_vector = "
+            f"setweight(to_tsvector('english', coalesce(r.title, '')), 'A')"
+            f" || setweight(to_tsvector('english', {tag_names}), 'B')"
+            f" || setweight(to_tsvector('english', {ingredient_names}), 'B')"
+            f" || setweight("
+            f"to_tsvector('english', coalesce(r.description, '')), 'C')"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_auto_20261018_0455'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search_idx'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
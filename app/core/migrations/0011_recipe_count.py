@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:20
+
+from django.db import migrations, models
+
+
+NAMED = [('tag', 'tags'), ('ingredient', 'ingredients')]
+
+
+def populate_recipe_counts(apps, schema_editor):
+    """Count the recipes of existing tags and ingredients."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation in NAMED:
+        model = apps.get_model('core', model_name)
+        link_table = getattr(Recipe, relation).through._meta.db_table
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {model._meta.db_table} t SET recipe_count = ('
+                f' SELECT count(*) FROM {link_table} l'
+                f' WHERE l.{model_name}_id = t.id'
+                f'), updated_at = now()'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='core_ingr_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name', 'id'], name='core_ingr_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='core_tag_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name', 'id'], name='core_tag_assigned_idx'),
+        ),
+        migrations.RunPython(populate_recipe_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:27
+
+from django.db import migrations, models
+
+
+def populate_ingredient_counts(apps, schema_editor):
+    """Count the ingredients of existing recipes."""
+    Recipe = apps.get_model('core', 'Recipe')
+    link_table = Recipe.ingredients.through._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {Recipe._meta.db_table} r SET ingredient_count = ('
+            f' SELECT count(*) FROM {link_table} l WHERE l.recipe_id = r.id'
+            f')'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            populate_ingredient_counts, migrations.RunPython.noop,
+        ),
+    ]
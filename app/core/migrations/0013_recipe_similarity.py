@@ -0,0 +1,141 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:48
+
+import random
+import struct
+import zlib
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+from psycopg2.extras import execute_values
+
+
+# A frozen copy of the MinHash scheme in core.similarity, which must keep
+# producing the same signatures for rows written by this migration.
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+SIGNATURE_BATCH_SIZE = 1000
+
+_PRIME = (1 << 31) - 1
+_rng = random.Random(20260101)
+_HASHES = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+
+def minhash_signature(tag_ids, ingredient_ids):
+    """Return the MinHash signature of a recipe, or None if it has no links."""
+    elements = [2 * pk for pk in tag_ids] + [
+        2 * pk + 1 for pk in ingredient_ids
+    ]
+    if not elements:
+        return None
+
+    return [
+        min((a * element + b) % _PRIME for element in elements)
+        for a, b in _HASHES
+    ]
+
+
+def lsh_bands(user_id, signature):
+    """Hash each band of a signature into one bucket key."""
+    if signature is None:
+        return []
+    packed = struct.pack(f'>{MINHASH_PERMUTATIONS}i', *signature)
+    width = 4 * LSH_ROWS
+
+    return [
+        zlib.crc32(
+            packed[band * width:(band + 1) * width],
+            zlib.crc32(struct.pack('>qq', user_id, band)),
+        )
+        for band in range(LSH_BANDS)
+    ]
+
+
+def write_similarity_signatures(apps, schema_editor, recipe_ids=None):
+    """Store signatures and LSH buckets of the given or all recipes."""
+    Recipe = apps.get_model('core', 'Recipe')
+    SimilarityBucket = apps.get_model('core', 'SimilarityBucket')
+    recipe_table = Recipe._meta.db_table
+    bucket_table = SimilarityBucket._meta.db_table
+    tag_table = Recipe.tags.through._meta.db_table
+    ingredient_table = Recipe.ingredients.through._meta.db_table
+    query = (
+        f'SELECT r.id, r.user_id, '
+        f'(SELECT array_agg(l.tag_id) FROM {tag_table} l'
+        f' WHERE l.recipe_id = r.id), '
+        f'(SELECT array_agg(l.ingredient_id) FROM {ingredient_table} l'
+        f' WHERE l.recipe_id = r.id) '
+        f'FROM {recipe_table} r'
+    )
+    params = []
+    if recipe_ids is not None:
+        query += ' WHERE r.id = ANY(%s)'
+        params.append(list(recipe_ids))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = [
+            (recipe_id, user_id, minhash_signature(
+                tag_ids or [], ingredient_ids or [],
+            ))
+            for recipe_id, user_id, tag_ids, ingredient_ids in cursor
+        ]
+        for start in range(0, len(rows), SIGNATURE_BATCH_SIZE):
+            batch = rows[start:start + SIGNATURE_BATCH_SIZE]
+            execute_values(
+                cursor,
+                f'WITH signature (id, minhash, keys) AS (VALUES %s), '
+                f'updated AS ('
+                f' UPDATE {recipe_table} AS r'
+                f' SET minhash = s.minhash FROM signature s WHERE r.id = s.id'
+                f'), deleted AS ('
+                f' DELETE FROM {bucket_table} AS b'
+                f' USING signature s WHERE b.recipe_id = s.id'
+                f') INSERT INTO {bucket_table} (recipe_id, key) '
+                f'SELECT s.id, k.key FROM signature s, '
+                f'unnest(s.keys) AS k (key)',
+                [
+                    (recipe_id, signature, lsh_bands(user_id, signature))
+                    for recipe_id, user_id, signature in batch
+                ],
+                template='(%s, %s::integer[], %s::bigint[])',
+                page_size=len(batch),
+            )
+
+
+def populate_similarity_signatures(apps, schema_editor):
+    """Compute signatures and buckets of existing recipes."""
+    write_similarity_signatures(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_ingredient_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='minhash',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), editable=False, null=True, size=None),
+        ),
+        migrations.CreateModel(
+            name='SimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='core.recipe')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='similaritybucket',
+            index=models.Index(fields=['key'], name='core_simbucket_key_idx'),
+        ),
+        migrations.RunPython(
+            populate_similarity_signatures, migrations.RunPython.noop,
+        ),
+    ]
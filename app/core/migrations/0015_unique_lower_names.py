@@ -0,0 +1,125 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+NAMED = [('tag', 'tags'), ('ingredient', 'ingredients')]
+
+# The frozen MinHash code of the migration that added signatures.
+similarity = import_module('core.migrations.0013_recipe_similarity')
+
+
+def update_recipes(apps, schema_editor, recipe_ids):
+    """Recompute the search vector and counts of recipes that were merged."""
+    Recipe = apps.get_model('core', 'Recipe')
+    tables = {
+        model_name: (
+            apps.get_model('core', model_name)._meta.db_table,
+            getattr(Recipe, relation).through._meta.db_table,
+        )
+        for model_name, relation in NAMED
+    }
+    names = {
+        model_name: (
+            f"coalesce((SELECT string_agg(n.name, ' ') FROM {link_table} l "
+            f"JOIN {table} n ON n.id = l.{model_name}_id "
+            f"WHERE l.recipe_id = r.id), '')"
+        )
+        for model_name, (table, link_table) in tables.items()
+    }
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Recipe._meta.db_table} r SET search_vector = "
+            f"setweight(to_tsvector('english', coalesce(r.title, '')), 'A')"
+            f" || setweight(to_tsvector('english', {names['tag']}), 'B')"
+            f" || setweight(to_tsvector('english', {names['ingredient']}),"
+            f" 'B')"
+            f" || setweight("
+            f"to_tsvector('english', coalesce(r.description, '')), 'C'), "
+            f"ingredient_count = ("
+            f" SELECT count(*) FROM {tables['ingredient'][1]} l"
+            f" WHERE l.recipe_id = r.id"
+            f"), updated_at = now() WHERE r.id = ANY(%s)",
+            [list(recipe_ids)],
+        )
+    similarity.write_similarity_signatures(apps, schema_editor, recipe_ids)
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and ingredients whose names only differ in letter case.
+
+    The oldest object of each (user, lower(name)) group is kept, links of
+    the others are moved to it with set-based statements and the merged
+    objects are deleted with a tombstone for sync clients.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    Tombstone = apps.get_model('core', 'Tombstone')
+    recipe_ids = set()
+    for model_name, relation in NAMED:
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        table = model._meta.db_table
+        link_table = through._meta.db_table
+        column = f'{model_name}_id'
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE merged_name AS '
+                f'SELECT id, keep_id, user_id FROM ('
+                f' SELECT id, user_id, min(id) OVER ('
+                f'  PARTITION BY user_id, lower(name)'
+                f' ) AS keep_id FROM {table}'
+                f') named WHERE id <> keep_id'
+            )
+            cursor.execute(
+                f'INSERT INTO {link_table} (recipe_id, {column}) '
+                f'SELECT l.recipe_id, m.keep_id FROM {link_table} l '
+                f'JOIN merged_name m ON m.id = l.{column} '
+                f'ON CONFLICT DO NOTHING'
+            )
+            cursor.execute(
+                f'DELETE FROM {link_table} l USING merged_name m '
+                f'WHERE m.id = l.{column} RETURNING l.recipe_id'
+            )
+            recipe_ids.update(row[0] for row in cursor.fetchall())
+            cursor.execute(
+                f'DELETE FROM {table} t USING merged_name m WHERE m.id = t.id'
+            )
+            cursor.execute(
+                f'INSERT INTO {Tombstone._meta.db_table} '
+                f'(user_id, model, object_id, deleted_at) '
+                f'SELECT user_id, %s, id, now() FROM merged_name',
+                [model_name],
+            )
+            cursor.execute(
+                f'UPDATE {table} t SET recipe_count = ('
+                f' SELECT count(*) FROM {link_table} l'
+                f' WHERE l.{column} = t.id'
+                f'), updated_at = now() '
+                f'WHERE t.id IN (SELECT keep_id FROM merged_name)'
+            )
+            cursor.execute('DROP TABLE merged_name')
+
+    if recipe_ids:
+        update_recipes(apps, schema_editor, recipe_ids)
+    # Run deferred foreign key checks now, pending trigger events would
+    # block creating the indexes in this transaction.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_range_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE UNIQUE INDEX core_{model_name}_user_lower_name_uniq '
+            f'ON core_{model_name} (user_id, lower(name))',
+            f'DROP INDEX core_{model_name}_user_lower_name_uniq',
+        )
+        for model_name, _ in NAMED
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants_failed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
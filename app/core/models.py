@@ -5,6 +5,9 @@ import uuid
 import os
 
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -70,6 +73,38 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_variants = models.JSONField(default=list, editable=False)
+    image_variants_failed = models.BooleanField(default=False, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    ingredient_count = models.PositiveIntegerField(default=0, editable=False)
+    minhash = ArrayField(
+        models.IntegerField(), null=True, editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-id'],
+                name='core_recipe_user_id_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_recipe_user_updated_idx',
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='core_recipe_user_price_idx',
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='core_recipe_user_time_idx',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='core_recipe_search_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -82,6 +117,38 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # Names are unique per user ignoring case, enforced by the
+        # core_tag_user_lower_name_uniq index on (user_id, lower(name))
+        # from migration 0015; Meta cannot declare expression indexes in
+        # Django 3.2.
+        indexes = [
+            models.Index(
+                fields=['user', '-name', 'id'],
+                name='core_tag_user_name_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_tag_user_updated_idx',
+            ),
+            models.Index(
+                fields=['user', 'recipe_count', 'id'],
+                name='core_tag_user_count_idx',
+            ),
+            models.Index(
+                fields=['user', '-name', 'id'],
+                name='core_tag_assigned_idx',
+                condition=models.Q(recipe_count__gt=0),
+            ),
+            GinIndex(
+                fields=['name'],
+                name='core_tag_name_trgm_idx',
+                opclasses=['gin_trgm_ops'],
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -94,6 +161,111 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # Names are unique per user ignoring case, enforced by the
+        # core_ingredient_user_lower_name_uniq index on (user_id, lower(name))
+        # from migration 0015; Meta cannot declare expression indexes in
+        # Django 3.2.
+        indexes = [
+            models.Index(
+                fields=['user', '-name', 'id'],
+                name='core_ingredient_user_name_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_ingr_user_updated_idx',
+            ),
+            models.Index(
+                fields=['user', 'recipe_count', 'id'],
+                name='core_ingr_user_count_idx',
+            ),
+            models.Index(
+                fields=['user', '-name', 'id'],
+                name='core_ingr_assigned_idx',
+                condition=models.Q(recipe_count__gt=0),
+            ),
+            GinIndex(
+                fields=['name'],
+                name='core_ingredient_name_trgm_idx',
+                opclasses=['gin_trgm_ops'],
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class SimilarityBucket(models.Model):
+    """LSH bucket that one band of a recipe's MinHash signature hashes to."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarity_buckets',
+    )
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key'], name='core_simbucket_key_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.key}'
+
+
+class ImageUpload(models.Model):
+    """Resumable chunked upload of a recipe image in progress."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.filename
+
+
+class Tombstone(models.Model):
+    """Record of a deleted recipe, tag or ingredient for delta sync."""
+    MODEL_CHOICES = [
+        ('recipe', 'Recipe'),
+        ('tag', 'Tag'),
+        ('ingredient', 'Ingredient'),
+    ]
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'deleted_at'],
+                name='core_tombstone_user_del_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+
+class ImportCheckpoint(models.Model):
+    """Number of records of a file an import has committed so far."""
+    name = models.TextField(unique=True)
+    path = models.TextField()
+    records = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} {self.records}'
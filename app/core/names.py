@@ -0,0 +1,58 @@
+"""
+Get-or-create of per-user tag and ingredient names.
+"""
+from django.db import connection
+
+
+def get_or_create_names(model, user_id, names):
+    """Return {name: (id, stored name)} for names, creating missing ones.
+
+    One INSERT ... ON CONFLICT DO NOTHING against the unique (user_id,
+    lower(name)) index creates missing names, existing rows are selected
+    alongside without being rewritten or locked. A name a concurrent
+    transaction committed while the insert waited on it is in neither
+    result of that statement, so it is looked up again afterwards; two
+    requests racing on a new name end up with the same object. Names
+    differing only in letter case resolve to the same object.
+    """
+    if not names:
+        return {}
+    table = model._meta.db_table
+    names = list(names)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH input AS ('
+            f' SELECT name, position'
+            f' FROM unnest(%s::text[]) WITH ORDINALITY AS n (name, position)'
+            f'), inserted AS ('
+            f' INSERT INTO {table} (user_id, name, updated_at, recipe_count)'
+            f' SELECT DISTINCT ON (lower(name)) %s, name, now(), 0'
+            f' FROM input ORDER BY lower(name), position'
+            f' ON CONFLICT (user_id, lower(name)) DO NOTHING'
+            f' RETURNING id, name'
+            f'), found AS ('
+            f' SELECT id, name FROM inserted'
+            f' UNION ALL'
+            f' SELECT id, name FROM {table}'
+            f' WHERE user_id = %s'
+            f' AND lower(name) IN (SELECT lower(name) FROM input)'
+            f') '
+            f'SELECT i.name, f.id, f.name FROM input i '
+            f'JOIN found f ON lower(f.name) = lower(i.name)',
+            [names, user_id, user_id],
+        )
+        named = {name: (pk, stored) for name, pk, stored in cursor.fetchall()}
+        missing = [name for name in names if name not in named]
+        if missing:
+            cursor.execute(
+                f'SELECT i.name, t.id, t.name'
+                f' FROM unnest(%s::text[]) AS i (name)'
+                f' JOIN {table} t'
+                f' ON t.user_id = %s AND lower(t.name) = lower(i.name)',
+                [missing, user_id],
+            )
+            named.update(
+                (name, (pk, stored)) for name, pk, stored in cursor.fetchall()
+            )
+
+    return named
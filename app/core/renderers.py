@@ -0,0 +1,44 @@
+"""
+Fast JSON renderer for the API.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON renderer using orjson, with output matching JSONRenderer.
+
+    orjson handles dicts, lists, strings, numbers, UUIDs and datetimes
+    natively and hands every other type (Decimal, lazy strings, querysets,
+    ...) to DRF's encoder. Indented, ASCII-only or non-compact output and
+    installs without orjson fall back to the stdlib renderer.
+    """
+    options = (
+        (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else None
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent or self.ensure_ascii or not self.compact:
+            return super().render(
+                data, accepted_media_type, renderer_context,
+            )
+        if data is None:
+            return b''
+
+        ret = orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            option=self.options,
+        )
+        # Keep escaping the separators JSONRenderer escapes for javascript.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029',
+            )
+
+        return ret
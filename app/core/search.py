@@ -0,0 +1,72 @@
+"""
+Full-text and trigram search helpers.
+"""
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.lookups import PostgresOperatorLookup
+from django.contrib.postgres.search import SearchVector
+from django.db.models import (
+    CharField,
+    FloatField,
+    Func,
+    OuterRef,
+    Subquery,
+    Value,
+)
+
+
+SEARCH_CONFIG = 'english'
+
+
+def _linked_names(through, column):
+    """Subquery joining the names linked to the outer recipe."""
+    return Subquery(
+        through.objects.filter(
+            recipe_id=OuterRef('pk'),
+        ).values('recipe_id').annotate(
+            names=StringAgg(f'{column}__name', ' '),
+        ).values('names')
+    )
+
+
+def recipe_search_vector(recipe_model):
+    """Weighted search vector over a recipe's text and linked names."""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            _linked_names(recipe_model.tags.through, 'tag'),
+            weight='B',
+            config=SEARCH_CONFIG,
+        )
+        + SearchVector(
+            _linked_names(recipe_model.ingredients.through, 'ingredient'),
+            weight='B',
+            config=SEARCH_CONFIG,
+        )
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes, **fields):
+    """Recompute the stored search vector for a queryset of recipes."""
+    return recipes.update(
+        search_vector=recipe_search_vector(recipes.model),
+        **fields,
+    )
+
+
+class TrigramWordSimilarity(Func):
+    """WORD_SIMILARITY(string, expression), as added in Django 4.0."""
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+    def __init__(self, string, expression, **extra):
+        if not hasattr(string, 'resolve_expression'):
+            string = Value(string)
+        super().__init__(string, expression, **extra)
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """Match fields containing a word similar to the value (pg_trgm)."""
+    lookup_name = 'trigram_word_similar'
+    postgres_operator = '%%>'
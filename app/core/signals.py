@@ -0,0 +1,213 @@
+"""
+Signal handlers for core models.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+)
+from core.search import update_search_vectors
+from core.similarity import update_similarity_signatures
+from core.usage import recipe_ingredient_count, update_recipe_counts
+
+
+SEARCH_FIELDS = {'title', 'description'}
+RECIPE_RELATIONS = {Tag: 'tags', Ingredient: 'ingredients'}
+
+# Users whose per-object tombstones and recounts are skipped on this
+# thread, either because the user is being deleted or because a caller
+# does that bookkeeping in bulk.
+_skipped = threading.local()
+
+
+def _skipped_user_ids():
+    if not hasattr(_skipped, 'user_ids'):
+        _skipped.user_ids = set()
+    return _skipped.user_ids
+
+
+@contextmanager
+def bulk_deletion(user_id):
+    """Skip per-object delete bookkeeping while the caller does it in bulk.
+
+    Tombstones of deleted recipes, tags and ingredients and the recipe
+    counts of tags and ingredients linked to deleted recipes are left to
+    the caller.
+    """
+    _skipped_user_ids().add(user_id)
+    try:
+        yield
+    finally:
+        _skipped_user_ids().discard(user_id)
+
+
+def _recount(model, ids):
+    """Refresh the recipe counts of tags or ingredients."""
+    if ids:
+        update_recipe_counts(
+            model.objects.filter(pk__in=ids),
+            getattr(Recipe, RECIPE_RELATIONS[model]).through,
+        )
+
+
+def _touch_recipes(recipes, relinked=True):
+    """Refresh search vectors, ingredient counts and modification times.
+
+    Similarity signatures only depend on which tags and ingredients are
+    linked, so they are left alone when relinked is false.
+    """
+    update_search_vectors(
+        recipes,
+        ingredient_count=recipe_ingredient_count(Recipe),
+        updated_at=timezone.now(),
+    )
+    if relinked:
+        update_similarity_signatures(recipes)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_search(sender, instance, update_fields=None, **kwargs):
+    """Keep the search vector current when recipe text changes."""
+    if update_fields and not SEARCH_FIELDS & set(update_fields):
+        return
+    update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_linked_search(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """Keep search vectors and timestamps current when links change."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _touch_recipes(Recipe.objects.filter(pk=instance.pk))
+        return
+
+    if action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            sender.objects.filter(
+                **{f'{instance._meta.model_name}_id': instance.pk}
+            ).values_list('recipe_id', flat=True)
+        )
+    elif action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_recipe_ids', [])
+
+    if action in ('post_add', 'post_remove', 'post_clear') and pk_set:
+        _touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_linked_counts(sender, instance, action, reverse, model, pk_set,
+                          **kwargs):
+    """Keep recipe counts current when links change."""
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _recount(type(instance), [instance.pk])
+        return
+
+    if action == 'pre_clear':
+        instance.__dict__.setdefault('_cleared_linked_ids', {})[model] = list(
+            sender.objects.filter(recipe_id=instance.pk).values_list(
+                f'{model._meta.model_name}_id', flat=True,
+            )
+        )
+    elif action == 'post_clear':
+        pk_set = instance.__dict__.get('_cleared_linked_ids', {}).pop(
+            model, [],
+        )
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _recount(model, pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def refresh_renamed_search(sender, instance, created, **kwargs):
+    """Keep linked recipes current when a tag or ingredient is renamed."""
+    if not created:
+        _touch_recipes(
+            Recipe.objects.filter(**{RECIPE_RELATIONS[sender]: instance}),
+            relinked=False,
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_deleted_search(sender, instance, **kwargs):
+    """Remember the recipes linked to a tag or ingredient being deleted."""
+    instance._deleted_recipe_ids = list(
+        Recipe.objects.filter(
+            **{RECIPE_RELATIONS[sender]: instance}
+        ).values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def refresh_deleted_search(sender, instance, **kwargs):
+    """Keep linked recipes current once a tag or ingredient is deleted."""
+    recipe_ids = instance.__dict__.pop('_deleted_recipe_ids', [])
+    if recipe_ids:
+        _touch_recipes(Recipe.objects.filter(pk__in=recipe_ids))
+
+
+@receiver(pre_delete, sender=Recipe)
+def collect_deleted_links(sender, instance, **kwargs):
+    """Remember the tags and ingredients of a recipe being deleted."""
+    if instance.user_id in _skipped_user_ids():
+        return
+    instance._deleted_linked_ids = {
+        model: list(
+            getattr(instance, relation).values_list('id', flat=True)
+        )
+        for model, relation in RECIPE_RELATIONS.items()
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def refresh_deleted_counts(sender, instance, **kwargs):
+    """Recount the tags and ingredients of a deleted recipe."""
+    linked = instance.__dict__.pop('_deleted_linked_ids', {})
+    for model, ids in linked.items():
+        _recount(model, ids)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def start_user_delete(sender, instance, **kwargs):
+    """Stop delete bookkeeping for a user being deleted."""
+    _skipped_user_ids().add(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def finish_user_delete(sender, instance, **kwargs):
+    """Forget a deleted user."""
+    _skipped_user_ids().discard(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_tombstone(sender, instance, **kwargs):
+    """Log a deleted object so sync clients can remove it."""
+    if instance.user_id in _skipped_user_ids():
+        return
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+    )
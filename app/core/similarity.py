@@ -0,0 +1,143 @@
+"""
+MinHash signatures and LSH buckets of recipe tag and ingredient sets.
+"""
+import random
+import struct
+import zlib
+from functools import lru_cache
+from itertools import islice
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from psycopg2.extras import execute_values
+
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+SIGNATURE_BATCH_SIZE = 1000
+# A cached element holds 64 ints, about 2.7 KB; enough for one user's
+# vocabulary at roughly 11 MB per worker.
+ELEMENT_HASH_CACHE_SIZE = 4096
+
+_PRIME = (1 << 31) - 1
+_rng = random.Random(20260101)
+_HASHES = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+
+def _elements(tag_ids, ingredient_ids):
+    """Map tag and ingredient ids into one integer universe."""
+    return [2 * pk for pk in tag_ids] + [2 * pk + 1 for pk in ingredient_ids]
+
+
+@lru_cache(maxsize=ELEMENT_HASH_CACHE_SIZE)
+def _element_hashes(element):
+    """Hash an element under every permutation.
+
+    Recipes of one user draw on a shared vocabulary, so caching the hashes
+    of each element turns a signature into a column-wise minimum.
+    """
+    return tuple((a * element + b) % _PRIME for a, b in _HASHES)
+
+
+def minhash_signature(tag_ids, ingredient_ids):
+    """Return the MinHash signature of a recipe, or None if it has no links.
+
+    The fraction of positions two signatures agree on estimates the
+    Jaccard similarity of the recipes' combined tag and ingredient sets.
+    """
+    elements = _elements(tag_ids, ingredient_ids)
+    if not elements:
+        return None
+
+    return list(map(min, zip(*map(_element_hashes, elements))))
+
+
+def lsh_bands(user_id, signature):
+    """Hash each band of a signature into one bucket key.
+
+    Keys include the user, so the bucket index only ever matches the
+    owner's recipes. Two recipes share a bucket when any band of their
+    signatures is identical.
+    """
+    if signature is None:
+        return []
+    packed = struct.pack(f'>{MINHASH_PERMUTATIONS}i', *signature)
+    width = 4 * LSH_ROWS
+
+    return [
+        zlib.crc32(
+            packed[band * width:(band + 1) * width],
+            zlib.crc32(struct.pack('>qq', user_id, band)),
+        )
+        for band in range(LSH_BANDS)
+    ]
+
+
+def estimate_similarity(signature, other):
+    """Estimate the Jaccard similarity of two signatures."""
+    return sum(a == b for a, b in zip(signature, other)) / len(signature)
+
+
+def _linked_ids(through, column):
+    """Subquery aggregating the ids linked to the outer recipe."""
+    return Subquery(
+        through.objects.filter(
+            recipe_id=OuterRef('pk'),
+        ).values('recipe_id').annotate(
+            ids=ArrayAgg(column),
+        ).values('ids')
+    )
+
+
+def _write_signatures(model, batch):
+    """Store signatures and replace the LSH buckets of a batch.
+
+    One statement per batch: the data-modifying CTEs share a snapshot, so
+    the DELETE only removes the buckets that existed before the INSERT.
+    """
+    bucket_model = model._meta.get_field('similarity_buckets').related_model
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            f'WITH signature (id, minhash, keys) AS (VALUES %s), '
+            f'updated AS ('
+            f' UPDATE {model._meta.db_table} AS r'
+            f' SET minhash = s.minhash FROM signature s WHERE r.id = s.id'
+            f'), deleted AS ('
+            f' DELETE FROM {bucket_model._meta.db_table} AS b'
+            f' USING signature s WHERE b.recipe_id = s.id'
+            f') INSERT INTO {bucket_model._meta.db_table} (recipe_id, key) '
+            f'SELECT s.id, k.key FROM signature s, unnest(s.keys) AS k (key)',
+            [
+                (recipe_id, signature, lsh_bands(user_id, signature))
+                for recipe_id, user_id, signature in batch
+            ],
+            template='(%s, %s::integer[], %s::bigint[])',
+            page_size=len(batch),
+        )
+
+
+def update_similarity_signatures(recipes):
+    """Recompute signatures and LSH buckets for a queryset of recipes."""
+    model = recipes.model
+    rows = recipes.annotate(
+        tag_ids=_linked_ids(model.tags.through, 'tag_id'),
+        ingredient_ids=_linked_ids(model.ingredients.through, 'ingredient_id'),
+    ).values_list('id', 'user_id', 'tag_ids', 'ingredient_ids').iterator()
+    while True:
+        batch = [
+            (recipe_id, user_id, minhash_signature(
+                tag_ids or [], ingredient_ids or [],
+            ))
+            for recipe_id, user_id, tag_ids, ingredient_ids in islice(
+                rows, SIGNATURE_BATCH_SIZE,
+            )
+        ]
+        if not batch:
+            break
+        _write_signatures(model, batch)
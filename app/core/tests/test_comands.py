@@ -1,13 +1,35 @@
 """
 Test custom Django management commands.
 """
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 from unittest.mock import patch
 
+from PIL import Image
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.core.management import call_command
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.management.commands import import_recipes
+from core.models import (
+    ImageUpload,
+    ImportCheckpoint,
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.export import iter_recipes, stream_csv
+from recipe.uploads import part_path
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +54,329 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the recipe benchmark command."""
+
+    def test_benchmark_filters_rolls_back(self):
+        """Test the filter benchmark reports timings and leaves no data."""
+        out = StringIO()
+
+        call_command(
+            'benchmark_recipes', 'filters',
+            recipes=20, vocabulary=12, repeat=1, stdout=out,
+        )
+
+        self.assertIn('join + distinct', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_benchmark_serializers(self):
+        """Test the serializer benchmark reports per-row costs."""
+        out = StringIO()
+
+        call_command(
+            'benchmark_recipes', 'serializers',
+            recipes=5, vocabulary=4, repeat=1, stdout=out,
+        )
+
+        self.assertIn('RecipeReadSerializer', out.getvalue())
+        self.assertIn('us/row', out.getvalue())
+
+
+class CleanImageUploadsCommandTests(TestCase):
+    """Test removing expired image uploads."""
+
+    def test_clean_image_uploads(self):
+        """Test expired sessions of all users and stray files are removed."""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'password123',
+        )
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+        )
+        expired = ImageUpload.objects.create(
+            recipe=recipe, filename='old.jpg', size=10,
+        )
+        ImageUpload.objects.filter(id=expired.id).update(
+            created_at=timezone.now() - timedelta(days=2),
+        )
+        active = ImageUpload.objects.create(
+            recipe=recipe, filename='new.jpg', size=10,
+        )
+        stray = ImageUpload(recipe=recipe, filename='stray.jpg', size=10)
+        for upload in (expired, active, stray):
+            os.makedirs(os.path.dirname(part_path(upload)), exist_ok=True)
+            open(part_path(upload), 'wb').close()
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(part_path(stray), (old, old))
+        out = StringIO()
+
+        call_command('clean_image_uploads', stdout=out)
+
+        self.assertIn(
+            'Removed 1 expired uploads and 1 stray files', out.getvalue(),
+        )
+        self.assertEqual(list(ImageUpload.objects.all()), [active])
+        self.assertFalse(os.path.exists(part_path(expired)))
+        self.assertFalse(os.path.exists(part_path(stray)))
+        self.assertTrue(os.path.exists(part_path(active)))
+        active.delete()
+
+
+class RenderImageVariantsCommandTests(TestCase):
+    """Test rendering missing image variants."""
+
+    def test_render_missing_variants(self):
+        """Test images left without variants are rendered, failures once."""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'password123',
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (300, 100)).save(buffer, format='JPEG')
+        name = default_storage.save('uploads/recipe/lost.jpg', buffer)
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+            image=name,
+        )
+        Recipe.objects.create(
+            user=user, title='Bread', time_minutes=5, price=Decimal('1.00'),
+            image='uploads/recipe/gone.jpg',
+        )
+        out, err = StringIO(), StringIO()
+
+        call_command('render_image_variants', stdout=out, stderr=err)
+
+        recipe.refresh_from_db()
+        self.assertEqual(
+            [(v['width'], v['format']) for v in recipe.image_variants],
+            [(200, 'webp'), (200, 'jpeg'), (300, 'webp'), (300, 'jpeg')],
+        )
+        self.assertIn(
+            'Rendered variants of 1 images, 1 failed', out.getvalue(),
+        )
+        self.assertIn('gone.jpg', err.getvalue())
+        self.assertTrue(
+            Recipe.objects.get(title='Bread').image_variants_failed
+        )
+        out = StringIO()
+        call_command('render_image_variants', stdout=out, stderr=StringIO())
+        self.assertIn('0 images, 0 failed', out.getvalue())
+        call_command(
+            'render_image_variants', retry_failed=True,
+            stdout=out, stderr=StringIO(),
+        )
+        self.assertIn('0 images, 1 failed', out.getvalue())
+        for variant in recipe.image_variants:
+            default_storage.delete(variant['name'])
+        default_storage.delete(name)
+
+
+class ImportCommandTests(TestCase):
+    """Test the recipe import command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as stream:
+            stream.write(content)
+
+        return path
+
+    def _import(self, path, stderr=None, **options):
+        out = StringIO()
+        call_command(
+            'import_recipes', path, user=self.user.email,
+            stdout=out, stderr=stderr or StringIO(), **options
+        )
+
+        return out.getvalue()
+
+    def test_import_ndjson(self):
+        """Test importing recipes with tags and ingredients from NDJSON."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        records = [
+            {
+                'title': 'Soup',
+                'time_minutes': 20,
+                'price': '4.50',
+                'tags': [{'name': 'Dinner'}, {'name': 'Vegan'}],
+                'ingredients': ['Salt'],
+            },
+            {'title': 'Cake', 'time_minutes': 60, 'price': '8.00',
+             'tags': ['Dinner']},
+        ]
+        path = self._write(
+            'recipes.ndjson',
+            '\n'.join(json.dumps(record) for record in records),
+        )
+
+        out = self._import(path, batch_size=1)
+
+        self.assertIn('Imported 2 recipes', out)
+        soup = Recipe.objects.get(user=self.user, title='Soup')
+        self.assertEqual(soup.price, Decimal('4.50'))
+        self.assertEqual(
+            sorted(soup.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'],
+        )
+        self.assertEqual(soup.ingredients.get().name, 'Salt')
+        self.assertIsNotNone(soup.search_vector)
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recipe_count')),
+            {'Dinner': 2, 'Vegan': 1},
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_import_matches_names_ignoring_case(self):
+        """Test imported names reuse existing names in any letter case."""
+        dinner = Tag.objects.create(user=self.user, name='Dinner')
+        records = [
+            {'title': 'Soup', 'time_minutes': 20, 'price': '4.50',
+             'tags': ['dinner', 'VEGAN']},
+            {'title': 'Cake', 'time_minutes': 60, 'price': '8.00',
+             'tags': ['DINNER', 'vegan']},
+        ]
+        path = self._write(
+            'recipes.ndjson',
+            '\n'.join(json.dumps(record) for record in records),
+        )
+
+        self._import(path)
+
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recipe_count')),
+            {'Dinner': 2, 'VEGAN': 2},
+        )
+        self.assertEqual(dinner.recipe_set.count(), 2)
+
+    def test_import_csv_skips_invalid_records(self):
+        """Test CSV records failing validation are skipped."""
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price,tags\n'
+            'Soup,20,4.50,"[""Dinner"", ""Vegan""]"\n'
+            ',20,4.50,\n'
+            'Cake,abc,8.00,\n'
+            'Pie,30,6.00,Dinner|Vegan\n'
+        ))
+
+        out = self._import(path)
+
+        self.assertIn('Imported 1 recipes, skipped 3', out)
+        soup = Recipe.objects.get(user=self.user)
+        self.assertEqual(soup.tags.count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 0)
+
+    def test_import_csv_export_round_trip(self):
+        """Test names containing separators survive a CSV export."""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=20,
+            price=Decimal('4.50'),
+        )
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt|Pepper'),
+            Ingredient.objects.create(user=self.user, name='Oil, "extra"'),
+        )
+        path = self._write('recipes.csv', ''.join(
+            stream_csv(iter_recipes(Recipe.objects.all()))
+        ))
+        recipe.delete()
+        Ingredient.objects.all().delete()
+
+        self._import(path)
+
+        self.assertEqual(
+            sorted(Recipe.objects.get().ingredients.values_list(
+                'name', flat=True,
+            )),
+            ['Oil, "extra"', 'Salt|Pepper'],
+        )
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test records before the checkpoint are not imported again."""
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price\n'
+            'Soup,20,4.50\n'
+            'Cake,60,8.00\n'
+        ))
+        ImportCheckpoint.objects.create(
+            name=os.path.abspath(path), path=os.path.abspath(path), records=1,
+        )
+
+        out = self._import(path)
+
+        self.assertIn('Resuming after 1 records', out)
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)),
+            ['Cake'],
+        )
+
+    def test_checkpoint_commits_with_batch(self):
+        """Test a failure after a batch resumes without writing it twice."""
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price\n'
+            'Soup,20,4.50\n'
+            'Cake,60,8.00\n'
+        ))
+        write_checkpoint = import_recipes.Command._write_checkpoint
+
+        def fail_second_batch(command, checkpoint, path, records):
+            write_checkpoint(command, checkpoint, path, records)
+            if records == 2:
+                raise RuntimeError('Crashed')
+
+        with patch.object(
+            import_recipes.Command, '_write_checkpoint', fail_second_batch,
+        ):
+            with self.assertRaises(RuntimeError):
+                self._import(path, batch_size=1)
+
+        self.assertEqual(ImportCheckpoint.objects.get().records, 1)
+        out = self._import(path, batch_size=1)
+
+        self.assertIn('Resuming after 1 records', out)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['Cake', 'Soup'],
+        )
+
+    def test_import_stamps_recipes_at_batch_end(self):
+        """Test imported recipes are stamped after the batch, not before."""
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price\n'
+            'Soup,20,4.50\n'
+        ))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT now()')
+            transaction_start = cursor.fetchone()[0]
+
+        self._import(path)
+
+        self.assertGreater(Recipe.objects.get().updated_at, transaction_start)
+
+    def test_import_reports_names_missing(self):
+        """Test tag objects without a name skip the record with its number."""
+        records = [
+            {'title': 'Soup', 'time_minutes': 20, 'price': '4.50'},
+            {'title': 'Cake', 'time_minutes': 60, 'price': '8.00',
+             'tags': [{'title': 'Dinner'}]},
+        ]
+        path = self._write(
+            'recipes.ndjson',
+            '\n'.join(json.dumps(record) for record in records),
+        )
+        err = StringIO()
+
+        out = self._import(path, stderr=err)
+
+        self.assertIn('Imported 1 recipes, skipped 1', out)
+        self.assertIn('Record 2 skipped', err.getvalue())
+        self.assertIn('need a name', err.getvalue())
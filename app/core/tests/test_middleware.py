@@ -0,0 +1,57 @@
+"""
+Tests for the query budget middleware.
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.middleware import query_budget, QueryBudgetExceeded
+
+
+CREATE_USER_URL = reverse('user:create')
+
+
+class QueryBudgetTests(TestCase):
+    """Test enforcing query budgets."""
+
+    def test_query_budget_within_limit(self):
+        """Test a block under the budget passes and reports its count."""
+        with query_budget(2) as counter:
+            get_user_model().objects.count()
+
+        self.assertEqual(counter.count, 1)
+
+    def test_query_budget_exceeded_raises(self):
+        """Test a block over the budget raises an error."""
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                get_user_model().objects.count()
+                get_user_model().objects.count()
+
+    @override_settings(QUERY_BUDGET=1)
+    def test_middleware_fails_request_over_budget(self):
+        """Test the middleware fails requests over QUERY_BUDGET."""
+        payload = {
+            'email': 'user@example.com',
+            'password': 'testpass123',
+            'name': 'Test Name',
+        }
+
+        with self.assertRaises(QueryBudgetExceeded):
+            APIClient().post(CREATE_USER_URL, payload)
+
+    @override_settings(QUERY_BUDGET=0)
+    def test_middleware_disabled(self):
+        """Test a zero budget disables the middleware."""
+        payload = {
+            'email': 'user@example.com',
+            'password': 'testpass123',
+            'name': 'Test Name',
+        }
+
+        res = APIClient().post(CREATE_USER_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
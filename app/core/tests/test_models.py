@@ -1,13 +1,17 @@
 """
 Test for models.
 """
+import threading
+import time
 from unittest.mock import patch
 from decimal import Decimal
 
-from django.test import TestCase
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 
 from core import models
+from core.names import get_or_create_names
 
 
 def create_user(email='user@example.com', password='testpass123'):
@@ -98,3 +102,159 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+    def test_recipe_links_update_timestamp(self):
+        """Test changing a recipe's tags updates its modification time."""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Sample recipe name',
+            time_minutes=5,
+            price=Decimal('5.50'),
+        )
+        updated_at = recipe.updated_at
+
+        recipe.tags.add(models.Tag.objects.create(user=user, name='Tag1'))
+        recipe.refresh_from_db()
+
+        self.assertGreater(recipe.updated_at, updated_at)
+
+    def test_recipe_counts_follow_links(self):
+        """Test tag and ingredient recipe counts track their links."""
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        ingredient = models.Ingredient.objects.create(user=user, name='Salt')
+        recipes = [
+            models.Recipe.objects.create(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('5.50'),
+            )
+            for i in range(3)
+        ]
+
+        def counts():
+            tag.refresh_from_db()
+            ingredient.refresh_from_db()
+            return tag.recipe_count, ingredient.recipe_count
+
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        recipes[0].ingredients.add(ingredient)
+        self.assertEqual(counts(), (3, 1))
+
+        recipes[0].tags.remove(tag)
+        self.assertEqual(counts(), (2, 1))
+
+        recipes[1].tags.clear()
+        self.assertEqual(counts(), (1, 1))
+
+        ingredient.recipe_set.add(recipes[1], recipes[2])
+        self.assertEqual(counts(), (1, 3))
+
+        recipes[2].delete()
+        self.assertEqual(counts(), (0, 2))
+
+        ingredient.recipe_set.clear()
+        self.assertEqual(counts(), (0, 0))
+
+    def test_ingredient_count_follows_links(self):
+        """Test a recipe's ingredient count tracks its links."""
+        user = create_user()
+        salt, pepper = [
+            models.Ingredient.objects.create(user=user, name=name)
+            for name in ('Salt', 'Pepper')
+        ]
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Soup',
+            time_minutes=5,
+            price=Decimal('5.50'),
+        )
+
+        def count():
+            recipe.refresh_from_db()
+            return recipe.ingredient_count
+
+        recipe.ingredients.add(salt, pepper)
+        self.assertEqual(count(), 2)
+
+        pepper.recipe_set.remove(recipe)
+        self.assertEqual(count(), 1)
+
+        salt.delete()
+        self.assertEqual(count(), 0)
+
+
+class ConcurrentCountTests(TransactionTestCase):
+    """Test recipe counts under concurrent link changes."""
+
+    def test_concurrent_links_counted(self):
+        """Test two transactions linking one tag both end up counted."""
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        recipes = [
+            models.Recipe.objects.create(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('5.50'),
+            )
+            for i in range(2)
+        ]
+        first_counted = threading.Event()
+
+        def link(recipe, hold):
+            try:
+                with transaction.atomic():
+                    if not hold:
+                        first_counted.wait(5)
+                    recipe.tags.add(tag)
+                    if hold:
+                        first_counted.set()
+                        time.sleep(0.5)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=link, args=(recipe, hold))
+            for recipe, hold in zip(recipes, [True, False])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 2)
+
+
+class ConcurrentNameTests(TransactionTestCase):
+    """Test tag and ingredient names created concurrently."""
+
+    def test_concurrent_new_name_shared(self):
+        """Test a name created by a concurrent transaction is returned."""
+        user = create_user()
+        inserted = threading.Event()
+        named = {}
+
+        def create():
+            try:
+                with transaction.atomic():
+                    named['first'] = get_or_create_names(
+                        models.Tag, user.id, ['Lunch'],
+                    )
+                    inserted.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=create)
+        thread.start()
+        inserted.wait(5)
+        named['second'] = get_or_create_names(models.Tag, user.id, ['LUNCH'])
+        thread.join()
+
+        self.assertEqual(named['second']['LUNCH'], named['first']['Lunch'])
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 1)
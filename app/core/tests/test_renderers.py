@@ -0,0 +1,81 @@
+"""
+Tests for the JSON renderer and parser.
+"""
+import io
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test the orjson renderer matches the stdlib renderer."""
+
+    def assertRendersLikeJSONRenderer(self, data, media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type),
+        )
+
+    def test_render_matches_json_renderer(self):
+        """Test common API types render byte for byte the same."""
+        self.assertRendersLikeJSONRenderer({
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'price': Decimal('5.25'),
+            'title': 'Crème brûlée \u2028 \u2029',
+            'created': datetime(2026, 1, 2, 3, 4, 5, 123456, timezone.utc),
+            'naive': datetime(2026, 1, 2, 3, 4, 5),
+            'local': datetime(
+                2026, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=2)),
+            ),
+            'day': date(2026, 1, 2),
+            'label': gettext_lazy('Recipe'),
+            'items': [1, 2.5, None, True, {'nested': []}],
+        })
+
+    def test_render_none(self):
+        """Test None renders an empty body."""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_render_indent_falls_back(self):
+        """Test indented output uses the stdlib renderer."""
+        self.assertRendersLikeJSONRenderer(
+            {'a': [1, 2]}, 'application/json; indent=4',
+        )
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test the orjson parser."""
+
+    def test_parse(self):
+        """Test UTF-8 JSON bodies parse like JSONParser."""
+        body = '{"title": "Crème", "price": "5.25", "tags": []}'.encode()
+
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+
+    def test_parse_error(self):
+        """Test malformed JSON raises a parse error."""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"title": '))
+
+    def test_parse_other_encoding(self):
+        """Test bodies in other encodings fall back to JSONParser."""
+        body = '{"title": "Crème"}'.encode('utf-16')
+
+        data = ORJSONParser().parse(
+            io.BytesIO(body), parser_context={'encoding': 'utf-16'},
+        )
+
+        self.assertEqual(data, {'title': 'Crème'})
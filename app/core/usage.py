@@ -0,0 +1,46 @@
+"""
+Recipe usage counts of tags and ingredients.
+"""
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def _linked_count(through, column):
+    """Subquery counting the link rows pointing at the outer object."""
+    return Coalesce(
+        Subquery(
+            through.objects.filter(
+                **{column: OuterRef('pk')}
+            ).values(column).annotate(
+                count=Count('pk'),
+            ).values('count')
+        ),
+        0,
+    )
+
+
+def update_recipe_counts(queryset, through):
+    """Recount the linked recipes of a queryset of tags or ingredients.
+
+    The rows are locked in id order first. The recount then runs as a
+    new statement, whose snapshot includes the links of any concurrent
+    transaction that recounted the same rows before it, so the last one
+    to commit never writes a stale count.
+    """
+    ids = list(
+        queryset.order_by('pk').select_for_update().values_list(
+            'pk', flat=True,
+        )
+    )
+    return queryset.model.objects.filter(pk__in=ids).update(
+        recipe_count=_linked_count(
+            through, f'{queryset.model._meta.model_name}_id',
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def recipe_ingredient_count(recipe_model):
+    """Subquery counting the ingredients of the outer recipe."""
+    return _linked_count(recipe_model.ingredients.through, 'recipe_id')
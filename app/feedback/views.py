@@ -84,7 +84,7 @@ def list_talent_categories(request):
     """
     API to fetch all talent categories along with their talents.
     """
-    categories = TalentCategory.objects.all()
+    categories = TalentCategory.objects.prefetch_related("talents").all()
     serializer = TalentCategorySerializer(categories, many=True)
     return Response(serializer.data)
 
@@ -0,0 +1,270 @@
+"""
+Bulk create, update and delete of recipes.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+)
+from core.search import update_search_vectors
+from core.similarity import update_similarity_signatures
+from core.signals import bulk_deletion
+from core.usage import recipe_ingredient_count, update_recipe_counts
+from recipe.cache import response_cache
+from recipe.serializers import (
+    RecipeSerializer,
+    RecipeDetailSerializer,
+    RecipeDetailReadSerializer,
+)
+
+
+RELATIONS = (
+    ('tags', Tag, 'tag_id'),
+    ('ingredients', Ingredient, 'ingredient_id'),
+)
+DUPLICATE_MESSAGE = 'Recipe is already updated or deleted in this batch.'
+
+
+class BulkRecipeWriter:
+    """Validate a batch of recipe changes and write it with set-based SQL.
+
+    Items are validated one by one without touching the database, then
+    every write of the batch runs in one transaction using a fixed number
+    of queries: one name lookup/insert per relation, one bulk insert or
+    update for the recipes and one insert/delete per link table.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+        self.context = {'request': request}
+        self.errors = []
+        self.linked = {model: set() for _, model, _ in RELATIONS}
+
+    def _error(self, op, index, detail):
+        self.errors.append({'op': op, 'index': index, 'errors': detail})
+
+    def validate(self, create, update, delete):
+        """Validate all items and return the valid ones per operation.
+
+        Each recipe may be updated or deleted once per batch, later items
+        naming it again are errors.
+        """
+        to_create = []
+        for index, item in enumerate(create):
+            serializer = RecipeDetailSerializer(
+                data=item,
+                context=self.context,
+            )
+            if serializer.is_valid():
+                to_create.append(serializer.validated_data)
+            else:
+                self._error('create', index, serializer.errors)
+
+        instances = Recipe.objects.filter(user=self.user).in_bulk(
+            [item['id'] for item in update]
+        )
+        to_update = []
+        seen = set()
+        for index, item in enumerate(update):
+            instance = instances.get(item['id'])
+            if instance is None:
+                self._error('update', index, {'id': ['Recipe not found.']})
+                continue
+            if instance.id in seen:
+                self._error('update', index, {'id': [DUPLICATE_MESSAGE]})
+                continue
+            seen.add(instance.id)
+            serializer = RecipeDetailSerializer(
+                instance,
+                data=item,
+                partial=True,
+                context=self.context,
+            )
+            if serializer.is_valid():
+                to_update.append((instance, serializer.validated_data))
+            else:
+                self._error('update', index, serializer.errors)
+
+        existing = set(Recipe.objects.filter(
+            user=self.user,
+            id__in=delete,
+        ).values_list('id', flat=True))
+        to_delete = []
+        for index, recipe_id in enumerate(delete):
+            if recipe_id not in existing:
+                self._error('delete', index, {'id': ['Recipe not found.']})
+            elif recipe_id in seen:
+                self._error('delete', index, {'id': [DUPLICATE_MESSAGE]})
+            else:
+                seen.add(recipe_id)
+                to_delete.append(recipe_id)
+
+        return to_create, to_update, to_delete
+
+    def _resolve_names(self, items):
+        """Map relation name -> tag/ingredient name -> ID for all items."""
+        helper = RecipeSerializer(context=self.context)
+        named = {}
+        for relation, model, _ in RELATIONS:
+            objs = helper._get_or_create_named(model, [
+                nested for item in items for nested in item.get(relation, [])
+            ])
+            named[relation] = {name: obj.id for name, obj in objs.items()}
+
+        return named
+
+    def _delete(self, recipe_ids):
+        """Delete recipes and log their tombstones in bulk."""
+        for relation, model, column in RELATIONS:
+            self.linked[model].update(
+                getattr(Recipe, relation).through.objects.filter(
+                    recipe_id__in=recipe_ids,
+                ).values_list(column, flat=True)
+            )
+        with bulk_deletion(self.user.id):
+            Recipe.objects.filter(user=self.user, id__in=recipe_ids).delete()
+        Tombstone.objects.bulk_create(
+            Tombstone(user=self.user, model='recipe', object_id=recipe_id)
+            for recipe_id in recipe_ids
+        )
+
+    def _create(self, items, named):
+        """Insert recipes and their links, returning the new IDs."""
+        recipes = Recipe.objects.bulk_create(
+            Recipe(user=self.user, **{
+                attr: value for attr, value in item.items()
+                if attr not in named
+            })
+            for item in items
+        )
+        for relation, model, column in RELATIONS:
+            self.linked[model].update(
+                named[relation][nested['name']]
+                for item in items for nested in item.get(relation, [])
+            )
+            through = getattr(Recipe, relation).through
+            through.objects.bulk_create([
+                through(recipe_id=recipe.id, **{column: related_id})
+                for recipe, item in zip(recipes, items)
+                for related_id in {
+                    named[relation][nested['name']]
+                    for nested in item.get(relation, [])
+                }
+            ])
+
+        return [recipe.id for recipe in recipes]
+
+    def _update(self, pairs, named):
+        """Update recipes and diff their links, returning the IDs."""
+        now = timezone.now()
+        fields = {'updated_at'}
+        for instance, item in pairs:
+            for attr, value in item.items():
+                if attr not in named:
+                    setattr(instance, attr, value)
+                    fields.add(attr)
+            instance.updated_at = now
+        Recipe.objects.bulk_update(
+            [instance for instance, _ in pairs],
+            sorted(fields),
+        )
+
+        for relation, model, column in RELATIONS:
+            wanted = {
+                instance.id: {
+                    named[relation][nested['name']]
+                    for nested in item[relation]
+                }
+                for instance, item in pairs if relation in item
+            }
+            if not wanted:
+                continue
+            through = getattr(Recipe, relation).through
+            current = through.objects.filter(
+                recipe_id__in=wanted,
+            ).values_list('id', 'recipe_id', column)
+            stale = {
+                link_id: related_id
+                for link_id, recipe_id, related_id in current
+                if related_id not in wanted[recipe_id]
+            }
+            linked = {
+                (recipe_id, related_id)
+                for _, recipe_id, related_id in current
+            }
+            added = [
+                (recipe_id, related_id)
+                for recipe_id, related_ids in wanted.items()
+                for related_id in related_ids
+                if (recipe_id, related_id) not in linked
+            ]
+            if stale:
+                through.objects.filter(id__in=stale).delete()
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{column: related_id})
+                for recipe_id, related_id in added
+            ])
+            self.linked[model].update(stale.values())
+            self.linked[model].update(related_id for _, related_id in added)
+
+        return [instance.id for instance, _ in pairs]
+
+    @transaction.atomic
+    def write(self, to_create, to_update, to_delete):
+        """Write validated changes in a single transaction."""
+        if to_delete:
+            self._delete(to_delete)
+        named = self._resolve_names(
+            to_create + [item for _, item in to_update]
+        )
+        created = self._create(to_create, named) if to_create else []
+        updated = self._update(to_update, named) if to_update else []
+        if created or updated:
+            recipes = Recipe.objects.filter(id__in=created + updated)
+            update_search_vectors(
+                recipes,
+                ingredient_count=recipe_ingredient_count(Recipe),
+            )
+            update_similarity_signatures(recipes)
+        for relation, model, _ in RELATIONS:
+            if self.linked[model]:
+                update_recipe_counts(
+                    model.objects.filter(pk__in=self.linked[model]),
+                    getattr(Recipe, relation).through,
+                )
+        response_cache.invalidate(self.user.id)
+
+        return created, updated
+
+    def _serialize(self, recipe_ids):
+        recipes = Recipe.objects.filter(
+            id__in=recipe_ids,
+        ).prefetch_related('tags', 'ingredients').in_bulk()
+
+        return RecipeDetailReadSerializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids],
+            many=True,
+            context=self.context,
+        ).data
+
+    def run(self, create, update, delete, atomic=True):
+        """Apply a batch, or return None if it is atomic and invalid."""
+        to_create, to_update, to_delete = self.validate(
+            create, update, delete,
+        )
+        if atomic and self.errors:
+            return None
+
+        created, updated = self.write(to_create, to_update, to_delete)
+
+        return {
+            'created': self._serialize(created),
+            'updated': self._serialize(list(dict.fromkeys(updated))),
+            'deleted': to_delete,
+            'errors': self.errors,
+        }
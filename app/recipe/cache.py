@@ -0,0 +1,256 @@
+"""
+Per-user response cache for the recipe APIs.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import (
+    http_date,
+    parse_etags,
+    parse_http_date_safe,
+)
+
+from rest_framework import status
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+
+class LRUCache:
+    """Small thread-safe in-process least recently used mapping."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the value for key, marking it recently used."""
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used overflow."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+
+class ResponseCache:
+    """Two-tier cache of response data keyed on a per-user version.
+
+    Entries live in an in-process LRU in front of the shared Django cache.
+    Every key embeds the user's current version, so bumping the version
+    invalidates all of that user's entries in both tiers at once.
+    """
+
+    def __init__(self, alias='default', maxsize=1024, timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+        self.local = LRUCache(maxsize)
+        self.stats = Counter()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _version_key(self, user_id):
+        return f'recipe-cache-version:{user_id}'
+
+    def _changed_key(self, user_id):
+        return f'recipe-cache-changed:{user_id}'
+
+    def get_version(self, user_id):
+        """Return the user's current version, creating it if missing."""
+        key = self._version_key(user_id)
+        version = self.backend.get(key)
+        if version is None:
+            # Start from the clock so a lost counter never reuses old keys.
+            self.backend.add(key, time.time_ns(), timeout=None)
+            version = self.backend.get(key)
+
+        return version
+
+    def bump_version(self, user_id):
+        """Invalidate every cached response of the user."""
+        key = self._version_key(user_id)
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            self.backend.add(key, time.time_ns(), timeout=None)
+        self.backend.set(self._changed_key(user_id), time.time(), None)
+
+    def get_changed_at(self, user_id):
+        """Return when the user's data last changed as a timestamp.
+
+        A lost stamp restarts at the current time and then holds, like a
+        lost version, so clients refetch once instead of on every poll.
+        """
+        key = self._changed_key(user_id)
+        changed_at = self.backend.get(key)
+        if changed_at is None:
+            self.backend.add(key, time.time(), timeout=None)
+            changed_at = self.backend.get(key)
+
+        return changed_at
+
+    def invalidate(self, user_id):
+        """Bump the user's version now and again once the write commits."""
+        self.bump_version(user_id)
+        transaction.on_commit(lambda: self.bump_version(user_id))
+
+    def make_key(self, request):
+        """Build the cache key for a request of the authenticated user."""
+        version = self.get_version(request.user.id)
+        digest = hashlib.md5(
+            request.build_absolute_uri().encode()
+        ).hexdigest()
+
+        return f'recipe-response:{request.user.id}:{version}:{digest}'
+
+    def get(self, key):
+        """Return cached data from the fastest tier holding it."""
+        data = self.local.get(key)
+        if data is not None:
+            self.stats['local_hits'] += 1
+            return data
+
+        data = self.backend.get(key)
+        if data is not None:
+            self.stats['shared_hits'] += 1
+            self.local.set(key, data)
+            return data
+
+        self.stats['misses'] += 1
+        return None
+
+    def set(self, key, data):
+        """Store data in both tiers."""
+        self.local.set(key, data)
+        self.backend.set(key, data, timeout=self.timeout)
+
+    def get_stats(self):
+        """Return hit/miss counts of this process and the LRU size."""
+        return {
+            'local_hits': self.stats['local_hits'],
+            'shared_hits': self.stats['shared_hits'],
+            'misses': self.stats['misses'],
+            'local_size': len(self.local),
+            'local_maxsize': self.local.maxsize,
+        }
+
+
+response_cache = ResponseCache(
+    maxsize=settings.RECIPE_CACHE_LRU_SIZE,
+    timeout=settings.RECIPE_CACHE_TIMEOUT,
+)
+
+
+class CachedResponseMixin:
+    """Serve list and retrieve responses from the per-user cache."""
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        key = response_cache.make_key(request)
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ConditionalListMixin:
+    """Answer list requests with ETag/Last-Modified validators and 304s.
+
+    Validators come from the user's version and change stamp in the shared
+    cache, which every write bumps, and the request URL, so they cost no
+    query and a 304 never serializes the body.
+    """
+
+    def get_validators(self, request):
+        """Return the strong ETag and Last-Modified time of a response."""
+        user_id = request.user.id
+        digest = hashlib.md5('|'.join([
+            str(response_cache.get_version(user_id)),
+            request.build_absolute_uri(),
+            request.accepted_media_type or '',
+        ]).encode()).hexdigest()
+
+        return f'"{digest}"', int(response_cache.get_changed_at(user_id))
+
+    def _is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        return bool(if_modified_since) and last_modified <= if_modified_since
+
+    def _conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if self._is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+
+class ConditionalResponseMixin(ConditionalListMixin):
+    """Answer list and retrieve requests conditionally."""
+
+    def retrieve(self, request, *args, **kwargs):
+        # Validators are per user, so check the object exists first: a
+        # missing or malformed ID is a 404 whatever the conditions.
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        get_object_or_404(
+            self.filter_queryset(self.get_queryset()).prefetch_related(
+                None,
+            ).values('pk'),
+            **{self.lookup_field: kwargs[lookup_url_kwarg]},
+        )
+
+        return self._conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
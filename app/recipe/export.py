@@ -0,0 +1,115 @@
+"""
+Streaming export of a user's recipes.
+"""
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.core.files.storage import default_storage
+
+from rest_framework.renderers import BaseRenderer
+
+from recipe.filters import RELATED_FILTERS
+
+
+EXPORT_CHUNK_SIZE = 500
+EXPORT_FIELDS = [
+    'id', 'title', 'time_minutes', 'price', 'link', 'description', 'image',
+]
+CSV_COLUMNS = EXPORT_FIELDS + list(RELATED_FILTERS)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renderer selecting newline delimited JSON exports."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Exports stream their own body, so only errors are rendered here.
+        return json.dumps(data).encode() + b'\n'
+
+
+class CSVRenderer(NDJSONRenderer):
+    """Renderer selecting CSV exports."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+def _linked_names(through, column, recipe_ids):
+    """Map recipe IDs to their linked {id, name} objects in one query."""
+    related = column[:-len('_id')]
+    linked = defaultdict(list)
+    rows = through.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).order_by(column).values_list('recipe_id', column, f'{related}__name')
+    for recipe_id, related_id, name in rows:
+        linked[recipe_id].append({'id': related_id, 'name': name})
+
+    return linked
+
+
+def iter_recipes(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield recipe rows with their tags and ingredients in flat memory.
+
+    Recipes are read through a server-side cursor and their relations are
+    loaded with one query per relation and chunk, so at most one chunk of
+    rows is held at a time.
+    """
+    rows = queryset.values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        recipe_ids = [row['id'] for row in chunk]
+        linked = {
+            param: _linked_names(through, column, recipe_ids)
+            for param, (through, column) in RELATED_FILTERS.items()
+        }
+        for row in chunk:
+            for param, names in linked.items():
+                row[param] = names.get(row['id'], [])
+            yield row
+
+
+def present_recipe(row, request):
+    """Format the values of a recipe row like the detail serializer."""
+    row['price'] = str(row['price'])
+    if row['image']:
+        row['image'] = request.build_absolute_uri(
+            default_storage.url(row['image'])
+        )
+    else:
+        row['image'] = None
+
+    return row
+
+
+def stream_ndjson(rows):
+    """Yield one JSON document per row."""
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+class _Echo:
+    """File-like object handing back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """Yield a CSV header and one line per row, related names as JSON.
+
+    Names may contain any character, so each related column holds a JSON
+    array of names rather than names joined on a separator.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        for param in RELATED_FILTERS:
+            row[param] = json.dumps(
+                [related['name'] for related in row[param]],
+            )
+        yield writer.writerow([row[column] for column in CSV_COLUMNS])
@@ -0,0 +1,79 @@
+"""
+Facet counts for filtered recipe lists.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Q
+
+from recipe.filters import RELATED_FILTERS
+
+
+FACET_BUCKETS = {
+    'price': [Decimal(edge) for edge in ('0', '5', '10', '20', '50')],
+    'time_minutes': [0, 15, 30, 60, 120],
+}
+
+
+def _bucket_ranges(edges):
+    """Pair bucket edges into (low, high) ranges, the last one open."""
+    return list(zip(edges, edges[1:] + [None]))
+
+
+def _bucket_filter(field, low, high):
+    condition = Q(**{f'{field}__gte': low})
+    if high is not None:
+        condition &= Q(**{f'{field}__lt': high})
+    return condition
+
+
+def _format_edge(edge):
+    if isinstance(edge, Decimal):
+        return f'{edge:.2f}'
+    return edge
+
+
+def _related_counts(recipes, param):
+    """Count the filtered recipes linked to each tag or ingredient."""
+    through, column = RELATED_FILTERS[param]
+    name = f'{column[:-len("_id")]}__name'
+    rows = through.objects.filter(
+        recipe_id__in=recipes.values('id'),
+    ).values(column, name).annotate(
+        count=Count('recipe_id'),
+    ).order_by('-count', name, column)
+
+    return [
+        {'id': row[column], 'name': row[name], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def get_facets(recipes):
+    """Return facet counts of a filtered recipe queryset.
+
+    Tag and ingredient counts are one GROUP BY over the link table each,
+    and the total plus every price and time bucket are filtered COUNTs of
+    a single aggregate, so the cost is three queries whatever the filters.
+    """
+    aggregates = {'count': Count('id')}
+    for field, edges in FACET_BUCKETS.items():
+        for index, (low, high) in enumerate(_bucket_ranges(edges)):
+            aggregates[f'{field}_{index}'] = Count(
+                'id', filter=_bucket_filter(field, low, high),
+            )
+    totals = recipes.order_by().aggregate(**aggregates)
+
+    facets = {'count': totals['count']}
+    for param in RELATED_FILTERS:
+        facets[param] = _related_counts(recipes, param)
+    for field, edges in FACET_BUCKETS.items():
+        facets[field] = [
+            {
+                'min': _format_edge(low),
+                'max': None if high is None else _format_edge(high),
+                'count': totals[f'{field}_{index}'],
+            }
+            for index, (low, high) in enumerate(_bucket_ranges(edges))
+        ]
+
+    return facets
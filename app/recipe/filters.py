@@ -0,0 +1,271 @@
+"""
+Filters for the recipe APIs.
+"""
+import heapq
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
+
+from rest_framework.exceptions import ValidationError
+
+from core.models import Recipe, SimilarityBucket
+from core.search import SEARCH_CONFIG, TrigramWordSimilarity
+from core.similarity import estimate_similarity, lsh_bands
+
+
+FILTER_MODES = ('any', 'all', 'none')
+MAX_FILTER_IDS = 100
+MAX_PANTRY_IDS = 500
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+MIN_TRIGRAM_LENGTH = 3
+ATTR_ORDERINGS = {
+    'name': ('-name', 'id'),
+    'usage': ('-recipe_count', '-id'),
+}
+RECIPE_ORDERINGS = {
+    'newest': ('-id',),
+    'price': ('price', 'id'),
+    'time_minutes': ('time_minutes', 'id'),
+    'title': ('title', 'id'),
+}
+
+RELATED_FILTERS = {
+    'tags': (Recipe.tags.through, 'tag_id'),
+    'ingredients': (Recipe.ingredients.through, 'ingredient_id'),
+}
+RANGE_FILTERS = {
+    'price': ('price_min', 'price_max', Decimal),
+    'time_minutes': ('time_min', 'time_max', int),
+}
+
+
+def params_to_ints(param, value, max_ids=MAX_FILTER_IDS):
+    """Convert a comma separated list of IDs to unique integers."""
+    try:
+        ids = [int(str_id) for str_id in value.split(',')]
+    except ValueError:
+        raise ValidationError(
+            {param: ['Must be a comma separated list of integer IDs.']}
+        )
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > max_ids:
+        raise ValidationError(
+            {param: [f'At most {max_ids} IDs are allowed.']}
+        )
+
+    return ids
+
+
+def param_to_number(param, value, number_type):
+    """Convert a range bound parameter to an int or a finite Decimal."""
+    try:
+        number = number_type(value)
+    except (ValueError, InvalidOperation):
+        number = None
+    if number is None or (
+        isinstance(number, Decimal) and not number.is_finite()
+    ):
+        kind = 'an integer' if number_type is int else 'a number'
+        raise ValidationError({param: [f'Must be {kind}.']})
+
+    return number
+
+
+def param_to_mode(param, value):
+    """Validate a filter mode parameter, defaulting to 'any'."""
+    mode = value or 'any'
+    if mode not in FILTER_MODES:
+        raise ValidationError(
+            {param: [f'Must be one of: {", ".join(FILTER_MODES)}.']}
+        )
+
+    return mode
+
+
+def _linked(through, column, ids):
+    """Correlated EXISTS over the link table for the outer recipe."""
+    return Exists(through.objects.filter(
+        recipe_id=OuterRef('pk'),
+        **{f'{column}__in': ids},
+    ))
+
+
+def filter_related(queryset, param, ids, mode='any'):
+    """Filter recipes by linked tag or ingredient IDs.
+
+    'any' keeps recipes linked to at least one ID, 'all' recipes linked to
+    every ID and 'none' recipes linked to none of them. Each check is a
+    correlated EXISTS against the link table, so no join or DISTINCT is
+    needed on the recipe rows.
+    """
+    through, column = RELATED_FILTERS[param]
+    if mode == 'any':
+        return queryset.filter(_linked(through, column, ids))
+    if mode == 'none':
+        return queryset.filter(~_linked(through, column, ids))
+
+    for related_id in ids:
+        queryset = queryset.filter(_linked(through, column, [related_id]))
+
+    return queryset
+
+
+def param_to_ordering(param, value, orderings):
+    """Validate an ordering parameter, returning its order_by fields."""
+    name = value or next(iter(orderings))
+    if name not in orderings:
+        raise ValidationError(
+            {param: [f'Must be one of: {", ".join(orderings)}.']}
+        )
+
+    return orderings[name]
+
+
+def filter_recipes(queryset, query_params):
+    """Apply the tag, ingredient, price and time filters of a request."""
+    for param in RELATED_FILTERS:
+        value = query_params.get(param)
+        mode = param_to_mode(
+            f'{param}_mode',
+            query_params.get(f'{param}_mode'),
+        )
+        if value:
+            ids = params_to_ints(param, value)
+            queryset = filter_related(queryset, param, ids, mode)
+
+    for field, (min_param, max_param, number_type) in RANGE_FILTERS.items():
+        for param, lookup in [(min_param, 'gte'), (max_param, 'lte')]:
+            value = query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{
+                    f'{field}__{lookup}': param_to_number(
+                        param, value, number_type,
+                    ),
+                })
+
+    return queryset
+
+
+def search_recipes(queryset, text):
+    """Filter recipes matching a web-style search and rank them.
+
+    The real valued rank is cast to double precision so the value a page
+    cursor carries compares equal to the rank it was read from.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+    ).order_by('-rank', '-id')
+
+
+def param_to_count(param, value):
+    """Validate an optional non-negative integer parameter."""
+    if not value:
+        return None
+    try:
+        count = int(value)
+    except ValueError:
+        count = -1
+    if count < 0:
+        raise ValidationError({param: ['Must be a non-negative integer.']})
+
+    return count
+
+
+def rank_by_pantry(queryset, ingredient_ids, max_missing=None):
+    """Rank recipes by how well a pantry of ingredients covers them.
+
+    Candidates are found from the ingredient side of the link table, whose
+    ingredient index serves as an ingredient -> recipes inverted index, so
+    only recipes sharing a pantry ingredient are read. The missing count
+    comes from the stored ingredient count rather than a recount of every
+    candidate's links. Fully makeable recipes come first, then those
+    missing the fewest ingredients; the whole (missing, -matched, -id)
+    key goes into page cursors, as most recipes tie on missing.
+    """
+    queryset = queryset.filter(
+        ingredients__in=ingredient_ids,
+    ).annotate(
+        matched=Count('ingredients'),
+        missing=F('ingredient_count') - F('matched'),
+    )
+    if max_missing is not None:
+        queryset = queryset.filter(missing__lte=max_missing)
+
+    return queryset.order_by('missing', '-matched', '-id')
+
+
+def param_to_limit(param, value):
+    """Validate a suggestion limit parameter."""
+    if not value:
+        return SUGGEST_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_SUGGEST_LIMIT:
+        raise ValidationError(
+            {param: [f'Must be an integer from 1 to {MAX_SUGGEST_LIMIT}.']}
+        )
+
+    return limit
+
+
+def suggest_names(queryset, text, limit=SUGGEST_LIMIT):
+    """Return the top named objects matching a prefix or fuzzy text.
+
+    Queries shorter than a trigram only match prefixes; longer ones use the
+    pg_trgm word-similarity operator backed by the name GIN index. Prefix
+    matches rank first, then by similarity.
+    """
+    if len(text) < MIN_TRIGRAM_LENGTH:
+        queryset = queryset.filter(name__istartswith=text)
+    else:
+        queryset = queryset.filter(name__trigram_word_similar=text)
+
+    return queryset.annotate(
+        prefix=Case(
+            When(name__istartswith=text, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        similarity=TrigramWordSimilarity(text, 'name'),
+    ).order_by('-prefix', '-similarity', 'name', 'id')[:limit]
+
+
+def similar_recipes(queryset, recipe, limit=SUGGEST_LIMIT):
+    """Return the recipes most similar to recipe, with their similarity.
+
+    Candidates share at least one LSH bucket with the recipe and are found
+    through the bucket key index, then ranked by the Jaccard similarity
+    their MinHash signatures estimate. Work grows with the number of near
+    neighbours, not with the number of recipes.
+    """
+    if recipe.minhash is None:
+        return []
+    candidates = queryset.filter(
+        pk__in=SimilarityBucket.objects.filter(
+            key__in=lsh_bands(recipe.user_id, recipe.minhash),
+        ).values('recipe_id'),
+    ).exclude(pk=recipe.pk).values_list('id', 'minhash')
+    ranked = heapq.nlargest(limit, (
+        (estimate_similarity(recipe.minhash, minhash), pk)
+        for pk, minhash in candidates
+    ))
+    recipes = queryset.in_bulk([pk for _, pk in ranked])
+
+    return [(recipes[pk], similarity) for similarity, pk in ranked]
@@ -0,0 +1,201 @@
+"""
+Responsive variants of uploaded recipe images.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from PIL import Image, ImageOps, features
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.models import Recipe
+from recipe.cache import response_cache
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_VARIANT_WIDTHS = (200, 400, 800, 1600)
+IMAGE_VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {
+        'format': 'JPEG', 'quality': 82, 'optimize': True,
+        'progressive': True,
+    },
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _variant_widths(width):
+    """Return the variant widths of an image, never upscaling it."""
+    return sorted({min(target, width) for target in IMAGE_VARIANT_WIDTHS})
+
+
+@lru_cache(maxsize=None)
+def variant_formats():
+    """Return the variant formats the installed Pillow can encode.
+
+    Pillow built without libwebp has no WEBP encoder, those variants are
+    skipped instead of failing every image.
+    """
+    formats = dict(IMAGE_VARIANT_FORMATS)
+    if not features.check('webp'):
+        logger.warning('Pillow has no WEBP support, skipping webp variants.')
+        del formats['webp']
+
+    return formats
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        'transparency' in image.info
+    )
+
+
+def _on_white(image):
+    """Composite an RGBA image onto white for formats without alpha."""
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+
+    return background
+
+
+def render_variants(image_file):
+    """Yield (width, format, bytes) for every variant of an image.
+
+    Orientation from EXIF is applied to the pixels and then all metadata
+    but the colour profile is dropped, so variants carry no camera or
+    location data. Transparency is kept where the format supports it and
+    flattened onto white for JPEG.
+    """
+    with Image.open(image_file) as original:
+        image = ImageOps.exif_transpose(original)
+        # Resize with premultiplied alpha so transparent pixels don't
+        # bleed their colour into the edges.
+        if _has_alpha(image):
+            image = image.convert('RGBA').convert('RGBa')
+        else:
+            image = image.convert('RGB')
+    icc_profile = original.info.get('icc_profile')
+    for width in _variant_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        variant = image.resize(
+            (width, height), Image.LANCZOS, reducing_gap=3.0,
+        )
+        if variant.mode == 'RGBa':
+            variant = variant.convert('RGBA')
+        variant.info = {}
+        for fmt, options in variant_formats().items():
+            buffer = io.BytesIO()
+            if icc_profile:
+                options = dict(options, icc_profile=icc_profile)
+            encoded = variant
+            if variant.mode == 'RGBA' and options['format'] == 'JPEG':
+                encoded = _on_white(variant)
+            encoded.save(buffer, **options)
+            yield width, fmt, buffer.getvalue()
+
+
+def generate_image_variants(recipe_id, name):
+    """Render, store and record the variants of a recipe image.
+
+    Variants are only recorded if the recipe still has the same image,
+    otherwise the files are removed again.
+    """
+    base = os.path.splitext(name)[0]
+    with default_storage.open(name) as image_file:
+        stored = [
+            {
+                'width': width,
+                'format': fmt,
+                'name': default_storage.save(
+                    f'{base}_{width}.{fmt}', ContentFile(data),
+                ),
+            }
+            for width, fmt, data in render_variants(image_file)
+        ]
+
+    recipe = Recipe.objects.filter(pk=recipe_id, image=name)
+    user_id = recipe.values_list('user_id', flat=True).first()
+    if user_id is None or not recipe.update(
+        image_variants=stored, updated_at=timezone.now(),
+    ):
+        for variant in stored:
+            default_storage.delete(variant['name'])
+        return []
+    response_cache.invalidate(user_id)
+
+    return stored
+
+
+def discard_image_variants(recipe_id):
+    """Delete the stored variants of a recipe once its new image commits.
+
+    Call in the transaction replacing the image: the row lock keeps a
+    worker from recording variants of the old image in the meantime.
+    """
+    variants = Recipe.objects.select_for_update().values_list(
+        'image_variants', flat=True,
+    ).get(pk=recipe_id)
+    names = [variant['name'] for variant in variants]
+
+    def delete():
+        for name in names:
+            default_storage.delete(name)
+
+    transaction.on_commit(delete)
+
+
+def record_variants_failed(recipe_id, name):
+    """Mark an image whose variants failed so backfills skip it."""
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants_failed=True,
+    )
+
+
+def _generate_in_worker(recipe_id, name):
+    try:
+        generate_image_variants(recipe_id, name)
+    except Exception:
+        logger.exception('Image variants of recipe %s failed.', recipe_id)
+        record_variants_failed(recipe_id, name)
+    finally:
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix='image-variants',
+            )
+
+        return _executor
+
+
+def schedule_image_variants(recipe):
+    """Generate the variants of a recipe's image once the upload commits.
+
+    The work runs in a thread pool of IMAGE_VARIANT_WORKERS threads so the
+    upload response is not held up; with 0 workers it runs inline.
+    """
+    recipe_id, name = recipe.id, recipe.image.name
+
+    def submit():
+        if settings.IMAGE_VARIANT_WORKERS:
+            _get_executor().submit(_generate_in_worker, recipe_id, name)
+        else:
+            generate_image_variants(recipe_id, name)
+
+    transaction.on_commit(submit)
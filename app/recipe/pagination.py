@@ -0,0 +1,187 @@
+"""
+Pagination for the recipe APIs.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import BooleanField, F, Func, Q, Value
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class Row(Func):
+    """SQL row constructor, ROW(a, b, ...)."""
+    function = 'ROW'
+
+
+class RowComparison(Func):
+    """Comparison of two row values, (a, b) < (x, y)."""
+    template = '%(expressions)s'
+    output_field = BooleanField()
+
+    def __init__(self, left, operator, right):
+        super().__init__(left, right, arg_joiner=f' {operator} ')
+
+
+def _key_field(queryset, name):
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+
+    return queryset.model._meta.get_field(name)
+
+
+def _expand_after(keys, values):
+    name, descending = keys[0]
+    after = Q(**{f'{name}__{"lt" if descending else "gt"}': values[0]})
+    if len(keys) == 1:
+        return after
+
+    return after | Q(**{name: values[0]}) & _expand_after(keys[1:], values[1:])
+
+
+def keyset_condition(ordering, position):
+    """Return the filter for rows after position in ordering.
+
+    position holds the values of every ordering key of a row. Orderings in
+    one direction compare the whole key as a row value, which btree indexes
+    on the same columns seek to directly. Mixed directions are expanded
+    into (k1 > v1) OR (k1 = v1 AND ...), bounded by k1 >= v1 so an index
+    on the leading key still limits the scan.
+    """
+    keys = [(key.lstrip('-'), key.startswith('-')) for key in ordering]
+    directions = {descending for _, descending in keys}
+    if len(keys) == 1:
+        return _expand_after(keys, position)
+    if len(directions) == 1:
+        return RowComparison(
+            Row(*[F(name) for name, _ in keys]),
+            '<' if directions.pop() else '>',
+            Row(*[Value(value) for value in position]),
+        )
+    name, descending = keys[0]
+
+    return Q(**{
+        f'{name}__{"lte" if descending else "gte"}': position[0],
+    }) & _expand_after(keys, position)
+
+
+def _invert(ordering):
+    return tuple(
+        key[1:] if key.startswith('-') else f'-{key}' for key in ordering
+    )
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination for recipes, newest first.
+
+    Cursors carry the value of every ordering key of the row a page ends
+    on, ending with the unique id, so the next page starts right after
+    that row however many rows tie on the leading keys. No page ever
+    skips rows with an OFFSET.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        """Page in the queryset's own ordering when it sets one."""
+        if queryset.query.order_by:
+            ordering = tuple(queryset.query.order_by)
+        else:
+            ordering = super().get_ordering(request, queryset, view)
+        assert ordering[-1].lstrip('-') in ('id', 'pk'), (
+            'Keyset orderings must end with the unique id.'
+        )
+
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        position, reverse = self.decode_cursor(request, queryset)
+        ordering = _invert(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_condition(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.cursor_position = position
+
+        return self.page
+
+    def decode_cursor(self, request, queryset):
+        """Return the (position, reverse) of the request's cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            values, reverse = json.loads(urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                _key_field(queryset, key.lstrip('-')).to_python(value)
+                for key, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, bool(reverse)
+
+    def encode_cursor(self, position, reverse):
+        """Return the page URL with a cursor at position."""
+        encoded = urlsafe_b64encode(json.dumps(
+            [position, int(reverse)], default=str,
+        ).encode()).decode()
+
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded,
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        return [getattr(instance, key.lstrip('-')) for key in ordering]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[-1], self.ordering,
+            )
+        else:
+            position = self.cursor_position
+
+        return self.encode_cursor(position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[0], self.ordering,
+            )
+        else:
+            position = self.cursor_position
+
+        return self.encode_cursor(position, reverse=True)
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Keyset pagination for tags and ingredients, by name."""
+    ordering = ('-name', 'id')
@@ -1,37 +1,98 @@
 """
 Serializers for recipe API
 """
+import operator
+import os
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.validators import get_available_image_extensions
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+
 from rest_framework import serializers
 
 from core.models import (
+    ImageUpload,
     Recipe,
     Tag,
     Ingredient,
 )
+from core.names import get_or_create_names
+
+
+BULK_MAX_ITEMS = 500
+
+
+class DynamicFieldsMixin:
+    """Serializer mixin keeping only the fields named in `fields`."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class UniqueNameMixin:
+    """Reject renaming to a name the user has in any letter case.
 
+    Nested in recipes, existing names are looked up rather than created,
+    so only top-level tag and ingredient serializers check.
+    """
 
-class IngredientSerializer(serializers.ModelSerializer):
+    def validate_name(self, value):
+        if self.root is not self:
+            return value
+        queryset = self.Meta.model.objects.alias(
+            lower_name=Lower('name'),
+        ).filter(
+            user=self.context['request'].user,
+            lower_name=Lower(Value(value)),
+        )
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(
+                f'A {self.Meta.model._meta.verbose_name} with this name '
+                f'already exists.'
+            )
+
+        return value
+
+
+class IngredientSerializer(UniqueNameMixin,
+                           DynamicFieldsMixin,
+                           serializers.ModelSerializer):
     """Serializer for ingredients."""
 
     class Meta:
         model = Ingredient
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(UniqueNameMixin,
+                    DynamicFieldsMixin,
+                    serializers.ModelSerializer):
     """Serializer for tags."""
 
     class Meta:
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for recipes."""
-    tags = TagSerializer(many=True, required=False)
-    ingredients = IngredientSerializer(many=True, required=False)
+    tags = TagSerializer(many=True, required=False, fields=['id', 'name'])
+    ingredients = IngredientSerializer(
+        many=True, required=False, fields=['id', 'name'],
+    )
 
     class Meta:
         model = Recipe
@@ -41,26 +102,49 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id']
 
+    def _get_or_create_named(self, model, items):
+        """Resolve named objects for the user, creating missing ones.
+
+        Returns {name: object} for every distinct name in items.
+        """
+        auth_user = self.context['request'].user
+        names = list(dict.fromkeys(item['name'] for item in items))
+
+        return {
+            name: model(id=pk, user=auth_user, name=stored)
+            for name, (pk, stored) in get_or_create_names(
+                model, auth_user.id, names,
+            ).items()
+        }
+
+    def _set_named(self, model, manager, items):
+        """Sync a named relation, only touching links that changed."""
+        current = {obj.name: obj.id for obj in manager.all()}
+        if {item['name'] for item in items} == set(current):
+            return
+
+        wanted = {
+            obj.id for obj in self._get_or_create_named(model, items).values()
+        }
+        linked = set(current.values())
+        if linked - wanted:
+            manager.remove(*(linked - wanted))
+        if wanted - linked:
+            manager.add(*(wanted - linked))
+
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creeating tags as needed."""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        tag_objs = self._get_or_create_named(Tag, tags)
+        if tag_objs:
+            recipe.tags.add(*tag_objs.values())
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed."""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient
-            )
-            recipe.ingredients.add(ingredient_obj)
+        ingredient_objs = self._get_or_create_named(Ingredient, ingredients)
+        if ingredient_objs:
+            recipe.ingredients.add(*ingredient_objs.values())
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe."""
         tags = validated_data.pop('tags', [])
@@ -71,16 +155,15 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe."""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._set_named(Tag, instance.tags, tags)
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._set_named(Ingredient, instance.ingredients, ingredients)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -89,11 +172,104 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Responsive variants of a recipe image with their URLs."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        variants = []
+        for variant in value:
+            url = default_storage.url(variant['name'])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            variants.append({
+                'width': variant['width'],
+                'format': variant['format'],
+                'url': url,
+            })
+
+        return variants
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
+    image_variants = ImageVariantsField()
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_variants',
+        ]
+
+
+def _render_many(render, value):
+    iterable = value.all() if isinstance(value, models.Manager) else value
+    return [render(item) for item in iterable]
+
+
+def compile_plan(serializer):
+    """Compile a serializer's readable fields into a render function.
+
+    The plan resolves every field's getter and converter once, so rendering
+    a row skips DRF's per-field dispatch while reusing the fields' own
+    to_representation wherever it is not a plain int() or str().
+    """
+    steps = []
+    for field in serializer._readable_fields:
+        if isinstance(field, serializers.ListSerializer):
+            convert = partial(_render_many, compile_plan(field.child))
+        elif isinstance(field, serializers.BaseSerializer):
+            convert = compile_plan(field)
+        elif type(field).to_representation is \
+                serializers.IntegerField.to_representation:
+            convert = int
+        elif type(field).to_representation is \
+                serializers.CharField.to_representation:
+            convert = str
+        else:
+            convert = field.to_representation
+        if field.source == '*':
+            get = field.get_attribute
+        else:
+            get = operator.attrgetter('.'.join(field.source_attrs))
+        steps.append((field.field_name, get, convert))
+
+    def render(instance):
+        data = {}
+        for name, get, convert in steps:
+            value = get(instance)
+            data[name] = None if value is None else convert(value)
+        return data
+
+    return render
+
+
+class PlannedReadSerializer(serializers.BaseSerializer):
+    """Read-only serializer rendering like source_serializer, faster."""
+    source_serializer = None
+
+    def __init__(self, *args, **kwargs):
+        self.source_fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def _render(self):
+        return compile_plan(self.source_serializer(
+            context=self.context,
+            fields=self.source_fields,
+        ))
+
+    def to_representation(self, instance):
+        return self._render(instance)
+
+
+class RecipeReadSerializer(PlannedReadSerializer):
+    """Read-only serializer for recipe lists."""
+    source_serializer = RecipeSerializer
+
+
+class RecipeDetailReadSerializer(PlannedReadSerializer):
+    """Read-only serializer for recipe details."""
+    source_serializer = RecipeDetailSerializer
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -104,3 +280,73 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'True'}}
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable recipe image upload sessions."""
+
+    class Meta:
+        model = ImageUpload
+        fields = ['id', 'filename', 'size', 'offset', 'created_at']
+        read_only_fields = ['id', 'offset', 'created_at']
+
+    def validate_filename(self, value):
+        """Require the file extension of an image format."""
+        ext = os.path.splitext(value)[1][1:].lower()
+        if ext not in get_available_image_extensions():
+            raise serializers.ValidationError(
+                f'File extension "{ext}" is not an image extension.'
+            )
+
+        return value
+
+    def validate_size(self, value):
+        """Limit images to IMAGE_UPLOAD_MAX_SIZE bytes."""
+        if not 0 < value <= settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Ensure this value is between 1 and '
+                f'{settings.IMAGE_UPLOAD_MAX_SIZE}.'
+            )
+
+        return value
+
+
+class ImageUploadFinalizeSerializer(serializers.Serializer):
+    """Serializer for finishing a resumable recipe image upload."""
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+
+
+class RecipeBulkSerializer(serializers.Serializer):
+    """Serializer for batches of recipe creates, updates and deletes."""
+    create = serializers.ListField(
+        child=serializers.DictField(), required=False, default=list,
+    )
+    update = serializers.ListField(
+        child=serializers.DictField(), required=False, default=list,
+    )
+    delete = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list,
+    )
+    atomic = serializers.BooleanField(default=True)
+
+    def validate_update(self, value):
+        """Require every update to name the integer ID of its recipe."""
+        for item in value:
+            if not isinstance(item.get('id'), int):
+                raise serializers.ValidationError(
+                    'Every update needs the integer id of a recipe.'
+                )
+
+        return value
+
+    def validate(self, data):
+        """Cap the number of items in a batch."""
+        total = sum(len(data[op]) for op in ('create', 'update', 'delete'))
+        if not total:
+            raise serializers.ValidationError('The batch is empty.')
+        if total > BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'At most {BULK_MAX_ITEMS} items are allowed per batch.'
+            )
+
+        return data
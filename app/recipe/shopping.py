@@ -0,0 +1,54 @@
+"""
+Shopping lists aggregated over many recipes.
+"""
+from decimal import Decimal
+
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Sum,
+)
+
+from recipe.filters import RELATED_FILTERS
+
+
+CENT = Decimal('0.01')
+
+
+def _format_price(value):
+    return f'{value.quantize(CENT):.2f}'
+
+
+def get_shopping_list(recipes):
+    """Return the ingredients of a recipe queryset merged into one list.
+
+    A single GROUP BY over the recipe-ingredient link table counts the
+    recipes needing each ingredient and splits every recipe's price evenly
+    over its stored ingredient count. The total is summed over the recipes
+    on their own, as recipes without ingredients have no link rows.
+    """
+    through, column = RELATED_FILTERS['ingredients']
+    rows = through.objects.filter(
+        recipe_id__in=recipes.values('id'),
+    ).values(column, 'ingredient__name').annotate(
+        recipe_count=Count('recipe_id'),
+        estimated_price=Sum(ExpressionWrapper(
+            F('recipe__price') / F('recipe__ingredient_count'),
+            output_field=DecimalField(),
+        )),
+    ).order_by('ingredient__name', column)
+
+    ingredients = []
+    for row in rows:
+        ingredients.append({
+            'id': row[column],
+            'name': row['ingredient__name'],
+            'recipe_count': row['recipe_count'],
+            'estimated_price': _format_price(row['estimated_price']),
+        })
+
+    total = recipes.aggregate(total=Sum('price'))['total'] or Decimal(0)
+
+    return {'ingredients': ingredients, 'total_price': _format_price(total)}
@@ -0,0 +1,43 @@
+"""
+Signal handlers for the recipe app.
+"""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+)
+from django.dispatch import receiver
+
+from core.models import (
+    ImageUpload,
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.cache import response_cache
+from recipe.uploads import discard_part
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_user_responses(sender, instance, **kwargs):
+    """Invalidate cached responses of the owner of a changed object."""
+    response_cache.invalidate(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_linked_responses(sender, instance, action, **kwargs):
+    """Invalidate cached responses when recipe links change."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        response_cache.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=ImageUpload)
+def remove_upload_part(sender, instance, **kwargs):
+    """Remove the part file of a finished or abandoned image upload."""
+    discard_part(instance)
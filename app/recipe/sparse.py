@@ -0,0 +1,109 @@
+"""
+Sparse fieldsets for the recipe APIs.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+from drf_spectacular.utils import OpenApiParameter, OpenApiTypes
+from rest_framework.exceptions import ValidationError
+
+
+SPARSE_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to return',
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to leave out',
+    ),
+]
+
+
+def _param_to_names(param, value, available):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValidationError({param: [
+            f'Unknown field(s): {", ".join(unknown)}. '
+            f'Choose from: {", ".join(available)}.'
+        ]})
+
+    return names
+
+
+def parse_sparse_fields(query_params, available):
+    """Return the field names selected by fields/omit, or None for all."""
+    fields = query_params.get('fields')
+    omit = query_params.get('omit')
+    if fields is None and omit is None:
+        return None
+
+    selected = available
+    if fields is not None:
+        selected = _param_to_names('fields', fields, available)
+    if omit is not None:
+        omitted = _param_to_names('omit', omit, available)
+        selected = [name for name in selected if name not in omitted]
+    if not selected:
+        raise ValidationError({'fields': ['At least one field is required.']})
+
+    return [name for name in available if name in selected]
+
+
+class SparseFieldsetMixin:
+    """Trim read responses to ?fields=/?omit= and load only what they use.
+
+    The selected names are passed to the serializer as its fields argument
+    and prune_queryset() defers unused columns and skips prefetches of
+    relations left out of the response.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self):
+        """Return the requested field names, or None for all fields."""
+        if self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            serializer_class = self.get_serializer_class()
+            serializer_class = getattr(
+                serializer_class, 'source_serializer', serializer_class,
+            )
+            self._sparse_fields = parse_sparse_fields(
+                self.request.query_params,
+                list(serializer_class().fields),
+            )
+
+        return self._sparse_fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+
+        return super().get_serializer(*args, **kwargs)
+
+    def prune_queryset(self, queryset, relations=()):
+        """Restrict columns and prefetches to the requested fields."""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset.prefetch_related(*relations)
+
+        model = queryset.model
+        columns = {model._meta.pk.name}
+        # Paginators read the ordering fields from the last row of a page.
+        for name in list(fields) + [
+            name.lstrip('-') for name in queryset.query.order_by
+            if isinstance(name, str)
+        ]:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.add(name)
+
+        return queryset.only(*columns).prefetch_related(
+            *[relation for relation in relations if relation in fields]
+        )
@@ -0,0 +1,175 @@
+"""
+Delta sync of a user's recipes, tags and ingredients.
+"""
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.utils import timezone as django_timezone
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+)
+from recipe.pagination import keyset_condition
+
+
+# Rows are stamped before their transaction commits, so each token points
+# this far back to catch writes that were still in flight while syncing.
+SYNC_LAG = timedelta(seconds=60)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+CHANGED_ORDERING = ('updated_at', 'id')
+DELETED_ORDERING = ('deleted_at', 'id')
+
+
+class ResyncRequired(APIException):
+    """The sync token predates the retained tombstones."""
+    status_code = status.HTTP_410_GONE
+    default_detail = 'The sync token expired, a full resync is required.'
+    default_code = 'resync_required'
+
+
+def _micros(moment):
+    # Exact integer arithmetic, float timestamps lose microseconds.
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def _moment(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def encode_token(moment, until=None, after=None):
+    """Encode a sync position as an opaque token.
+
+    A token holds the time changes are synced from and, while a sync is
+    paged, the time the next sync starts from and the (time, id) of the
+    last row sent of each kind.
+    """
+    state = {'since': None if moment is None else _micros(moment)}
+    if until is not None:
+        state['until'] = _micros(until)
+        state['after'] = {
+            key: [_micros(position[0]), position[1]]
+            for key, position in after.items()
+        }
+
+    return base64.urlsafe_b64encode(
+        f'v2:{json.dumps(state, separators=(",", ":"))}'.encode()
+    ).decode()
+
+
+def decode_token(token):
+    """Decode a sync token, raising a validation error if malformed.
+
+    Returns (since, until, after) where until and after are None unless
+    the token continues a paged sync.
+    """
+    try:
+        version, payload = base64.urlsafe_b64decode(
+            token.encode()
+        ).decode().split(':', 1)
+        if version != 'v2':
+            raise ValueError(version)
+        state = json.loads(payload)
+        since = state['since']
+        since = None if since is None else _moment(int(since))
+        if 'until' not in state:
+            return since, None, None
+        after = {
+            key: (_moment(int(micros)), int(pk))
+            for key, (micros, pk) in state['after'].items()
+        }
+
+        return since, _moment(int(state['until'])), after
+    except (ValueError, UnicodeError, TypeError, KeyError, AttributeError):
+        raise ValidationError({'since': ['Invalid sync token.']})
+
+
+def _page(queryset, ordering, position, size):
+    """Return up to size rows after position and whether more follow."""
+    queryset = queryset.order_by(*ordering)
+    if position is not None:
+        queryset = queryset.filter(keyset_condition(ordering, position))
+    rows = list(queryset[:size + 1])
+
+    return rows[:size], len(rows) > size
+
+
+def get_changes(user, since=None, until=None, after=None):
+    """Return a page of changed objects and deleted IDs since a time.
+
+    Every kind of object is paged on its own (updated_at, id) key, or
+    (deleted_at, id) for tombstones, at most SYNC_PAGE_SIZE rows each per
+    page; each lookup is a range scan of the (user, updated_at) or
+    (user, deleted_at) index. Returns (changed, deleted, next_token,
+    more): while more is true next_token continues this sync, afterwards
+    it starts the next one. Tokens older than the tombstone retention
+    raise ResyncRequired, deletions before it are no longer known.
+    """
+    now = django_timezone.now()
+    retention = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    if since is not None and since < now - retention:
+        raise ResyncRequired()
+    if until is None:
+        until, after = now - SYNC_LAG, {}
+    size = settings.SYNC_PAGE_SIZE
+    querysets = {
+        'recipes': Recipe.objects.filter(user=user).prefetch_related(
+            'tags', 'ingredients',
+        ),
+        'tags': Tag.objects.filter(user=user),
+        'ingredients': Ingredient.objects.filter(user=user),
+    }
+    changed, more, positions = {}, False, {}
+    for key, queryset in querysets.items():
+        if since is not None:
+            queryset = queryset.filter(updated_at__gte=since)
+        rows, has_more = _page(
+            queryset, CHANGED_ORDERING, after.get(key), size,
+        )
+        changed[key] = rows
+        more = more or has_more
+        positions[key] = (
+            (rows[-1].updated_at, rows[-1].id) if rows else after.get(key)
+        )
+
+    deleted = {'recipes': [], 'tags': [], 'ingredients': []}
+    if since is not None:
+        tombstones, has_more = _page(
+            Tombstone.objects.filter(user=user, deleted_at__gte=since),
+            DELETED_ORDERING, after.get('deleted'), size,
+        )
+        for tombstone in tombstones:
+            deleted[f'{tombstone.model}s'].append(tombstone.object_id)
+        more = more or has_more
+        positions['deleted'] = (
+            (tombstones[-1].deleted_at, tombstones[-1].id) if tombstones
+            else after.get('deleted')
+        )
+
+    if more:
+        next_token = encode_token(since, until, {
+            key: position for key, position in positions.items()
+            if position is not None
+        })
+    else:
+        next_token = encode_token(until)
+
+    return changed, deleted, next_token, more
+
+
+def prune_tombstones():
+    """Delete tombstones older than the retention, returning how many."""
+    cutoff = django_timezone.now() - timedelta(
+        days=settings.SYNC_TOMBSTONE_RETENTION_DAYS,
+    )
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+
+    return deleted
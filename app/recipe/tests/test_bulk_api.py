@@ -0,0 +1,241 @@
+"""
+Tests for the bulk recipe API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+)
+from recipe.serializers import BULK_MAX_ITEMS
+
+
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def recipe_payload(i, **params):
+    """Return the payload of a new recipe."""
+    payload = {
+        'title': f'Recipe {i}',
+        'time_minutes': 10 + i,
+        'price': '2.50',
+        'tags': [{'name': 'Dinner'}, {'name': f'Tag {i}'}],
+        'ingredients': [{'name': 'Salt'}],
+    }
+    payload.update(params)
+
+    return payload
+
+
+class PublicBulkApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to call API."""
+        res = APIClient().post(BULK_URL, {}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateBulkApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """Test creating many recipes with nested tags and ingredients."""
+        payload = {'create': [recipe_payload(i) for i in range(3)]}
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['created']), 3)
+        self.assertEqual(res.data['errors'], [])
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(Tag.objects.filter(name='Dinner').count(), 1)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        for recipe, data in zip(recipes.order_by('id'), res.data['created']):
+            self.assertEqual(recipe.id, data['id'])
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 1)
+            self.assertIsNotNone(recipe.search_vector)
+
+    def test_bulk_create_queries_do_not_scale(self):
+        """Test the write queries of a batch do not grow with its size."""
+        self.client.post(
+            BULK_URL, {'create': [recipe_payload(0)]}, format='json',
+        )
+
+        def count_queries(payloads):
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(
+                    BULK_URL, {'create': payloads}, format='json',
+                )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx)
+
+        small = count_queries([recipe_payload(i) for i in range(1, 3)])
+        large = count_queries([recipe_payload(i) for i in range(3, 23)])
+
+        self.assertEqual(small, large)
+
+    def test_bulk_update_and_delete(self):
+        """Test updating and deleting recipes in the same batch."""
+        recipe = create_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Old'))
+        removed = create_recipe(self.user)
+        payload = {
+            'update': [{
+                'id': recipe.id,
+                'title': 'New title',
+                'tags': [{'name': 'New'}],
+            }],
+            'delete': [removed.id],
+        }
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+        self.assertEqual(
+            list(recipe.tags.values_list('name', flat=True)),
+            ['New'],
+        )
+        self.assertEqual(res.data['updated'][0]['title'], 'New title')
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recipe_count')),
+            {'Old': 0, 'New': 1},
+        )
+        self.assertEqual(res.data['deleted'], [removed.id])
+        self.assertFalse(Recipe.objects.filter(id=removed.id).exists())
+        self.assertEqual(
+            Tombstone.objects.filter(
+                user=self.user,
+                model='recipe',
+                object_id=removed.id,
+            ).count(),
+            1,
+        )
+
+    def test_atomic_batch_rejects_invalid_item(self):
+        """Test one invalid item rejects an atomic batch as a whole."""
+        payload = {
+            'create': [recipe_payload(0), recipe_payload(1, title='')],
+        }
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['errors']), 1)
+        self.assertEqual(res.data['errors'][0]['op'], 'create')
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertIn('title', res.data['errors'][0]['errors'])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_non_atomic_batch_reports_item_errors(self):
+        """Test a non-atomic batch writes valid items and reports others."""
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        other_recipe = create_recipe(other_user)
+        payload = {
+            'atomic': False,
+            'create': [recipe_payload(0), recipe_payload(1, price='abc')],
+            'delete': [other_recipe.id],
+        }
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['created']), 1)
+        self.assertEqual(
+            [(e['op'], e['index']) for e in res.data['errors']],
+            [('create', 1), ('delete', 0)],
+        )
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+        self.assertTrue(Recipe.objects.filter(id=other_recipe.id).exists())
+
+    def test_recipe_changed_once_per_batch(self):
+        """Test a recipe repeated in updates or deletes is rejected."""
+        recipe = create_recipe(self.user)
+        payload = {
+            'update': [
+                {'id': recipe.id, 'title': 'First'},
+                {'id': recipe.id, 'title': 'Second'},
+            ],
+            'delete': [recipe.id],
+        }
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [(e['op'], e['index']) for e in res.data['errors']],
+            [('update', 1), ('delete', 0)],
+        )
+        recipe.refresh_from_db()
+        self.assertNotIn(recipe.title, ['First', 'Second'])
+
+        payload = {'atomic': False, 'delete': [recipe.id, recipe.id]}
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['deleted'], [recipe.id])
+        self.assertEqual(
+            [(e['op'], e['index']) for e in res.data['errors']],
+            [('delete', 1)],
+        )
+        self.assertEqual(Tombstone.objects.filter(
+            user=self.user, object_id=recipe.id,
+        ).count(), 1)
+
+    def test_batch_size_limited(self):
+        """Test batches above the limit and empty batches are rejected."""
+        too_many = {'delete': list(range(1, BULK_MAX_ITEMS + 2))}
+
+        res = self.client.post(BULK_URL, too_many, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(BULK_URL, {}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_requires_id(self):
+        """Test updates without an integer ID are rejected."""
+        payload = {'update': [{'title': 'No id'}]}
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('update', res.data)
@@ -0,0 +1,142 @@
+"""
+Tests for the recipe export API.
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.export import CSV_COLUMNS, iter_recipes
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicExportApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to call API."""
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateExportApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _export(self, **params):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+
+        return res, b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test recipes stream as one JSON document per line."""
+        recipe = create_recipe(self.user, title='Soup')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Dinner'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'),
+        )
+        create_recipe(self.user, title='Cake')
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        create_recipe(other_user, title='Other')
+
+        res, body = self._export()
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.ndjson', res['Content-Disposition'])
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Soup', 'Cake'])
+        self.assertEqual(rows[0]['price'], '5.25')
+        self.assertEqual(rows[0]['tags'][0]['name'], 'Dinner')
+        self.assertEqual(rows[0]['ingredients'][0]['name'], 'Salt')
+        self.assertEqual(rows[1]['tags'], [])
+        self.assertIsNone(rows[1]['image'])
+
+    def test_export_csv(self):
+        """Test recipes stream as CSV with tag names as a JSON array."""
+        recipe = create_recipe(self.user, title='Soup, hot')
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Dinner'),
+            Tag.objects.create(user=self.user, name='Vegan|Raw'),
+        )
+
+        res, body = self._export(format='csv')
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], CSV_COLUMNS)
+        row = dict(zip(CSV_COLUMNS, rows[1]))
+        self.assertEqual(row['title'], 'Soup, hot')
+        self.assertEqual(json.loads(row['tags']), ['Dinner', 'Vegan|Raw'])
+
+    def test_export_applies_filters(self):
+        """Test the list filters narrow down the export."""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        recipe = create_recipe(self.user, title='Soup')
+        recipe.tags.add(tag)
+        create_recipe(self.user, title='Cake')
+
+        res, body = self._export(tags=str(tag.id))
+
+        self.assertEqual(
+            [json.loads(line)['title'] for line in body.splitlines()],
+            ['Soup'],
+        )
+
+    def test_export_loads_relations_per_chunk(self):
+        """Test relations are loaded with one query per chunk."""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        for i in range(5):
+            create_recipe(self.user, title=f'Recipe {i}').tags.add(tag)
+        queryset = Recipe.objects.filter(user=self.user).order_by('id')
+
+        with CaptureQueriesContext(connection) as ctx:
+            rows = list(iter_recipes(queryset, chunk_size=2))
+
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(row['tags'] for row in rows))
+        link_queries = [
+            query for query in ctx.captured_queries
+            if 'core_recipe_tags' in query['sql']
+        ]
+        self.assertEqual(len(link_queries), 3)
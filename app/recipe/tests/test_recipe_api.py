@@ -2,19 +2,31 @@
 Tests for recipe APIs.
 """
 from decimal import Decimal
+import hashlib
+import io
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
 
+from core.middleware import query_budget, QueryBudgetExceeded
+from core.names import get_or_create_names
 from core.models import (
+    ImageUpload,
     Recipe,
     Tag,
     Ingredient,
@@ -23,9 +35,21 @@ from core.models import (
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
+    RecipeReadSerializer,
+    RecipeDetailReadSerializer,
 )
+from recipe.cache import response_cache
+from recipe.filters import filter_recipes, RECIPE_ORDERINGS
+from recipe.images import render_variants, variant_formats
+from recipe.shopping import get_shopping_list
+from recipe.uploads import ChunkParser, part_path, write_chunk
+from recipe.views import RecipeViewSet
 
 RECIPES_URL = reverse('recipe:recipe-list')
+CACHE_STATS_URL = reverse('recipe:cache-stats')
+FACETS_URL = reverse('recipe:recipe-facets')
+PANTRY_URL = reverse('recipe:recipe-pantry')
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
 
 
 def detail_url(recipe_id):
@@ -33,11 +57,27 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+def similar_url(recipe_id):
+    """Create and return a similar recipes URL."""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
 def image_upload_url(recipe_id):
     """Create and return a recipe detail URL."""
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+def image_uploads_url(recipe_id):
+    """Create and return the URL starting resumable image uploads."""
+    return reverse('recipe:recipe-image-uploads', args=[recipe_id])
+
+
+def image_upload_session_url(recipe_id, upload_id, finalize=False):
+    """Create and return the URL of a resumable image upload."""
+    name = 'finalize-image-upload' if finalize else 'image-upload'
+    return reverse(f'recipe:recipe-{name}', args=[recipe_id, upload_id])
+
+
 def create_recipe(user, **params):
     """Create and return a sample recipe."""
     defaults = {
@@ -89,7 +129,7 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user"""
@@ -103,7 +143,59 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_list_recipes_fixed_queries(self):
+        """Test listing recipes does not run queries per recipe."""
+        def list_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt')
+        )
+        baseline = list_queries()
+        for i in range(10):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}')
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Item {i}')
+            )
+
+        self.assertEqual(list_queries(), baseline)
+
+        with query_budget(4):
+            self.client.get(detail_url(recipe.id))
+
+    def test_list_recipes_cursor_paginated(self):
+        """Test recipes are paginated with an opaque cursor."""
+        recipes = [
+            create_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(3)
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertFalse(
+            any('COUNT(' in q['sql'] for q in ctx.captured_queries)
+        )
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipes[2].id, recipes[1].id])
+
+        res = self.client.get(res.data['next'])
+
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipes[0].id])
+        self.assertIsNone(res.data['next'])
 
     def test_get_recipe_detail(self):
         """Test get recipe detail."""
@@ -251,6 +343,50 @@ class PrivateRecipeAPITests(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_reuses_names_ignoring_case(self):
+        """Test tag names in any letter case resolve to one tag."""
+        tag = Tag.objects.create(user=self.user, name='Indian')
+        payload = {
+            'title': 'Pongal',
+            'time_minutes': 60,
+            'price': Decimal('4.50'),
+            'tags': [{'name': 'indian'}, {'name': 'Lunch'}, {'name': 'LUNCH'}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(Tag.objects.filter(user=self.user).values_list(
+                'name', flat=True,
+            )),
+            ['Indian', 'Lunch'],
+        )
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(recipe.tags.count(), 2)
+
+    def test_get_or_create_names_single_query(self):
+        """Test names are looked up and created in one statement."""
+        tag = Tag.objects.create(user=self.user, name='Indian')
+        tuple_id = Tag.objects.raw(
+            'SELECT id, ctid FROM core_tag WHERE id = %s', [tag.id],
+        )[0].ctid
+
+        with self.assertNumQueries(1):
+            named = get_or_create_names(
+                Tag, self.user.id, ['INDIAN', 'Lunch'],
+            )
+
+        self.assertEqual(named['INDIAN'][1], 'Indian')
+        self.assertEqual(
+            Tag.objects.get(user=self.user, name='Lunch').id,
+            named['Lunch'][0],
+        )
+        self.assertEqual(Tag.objects.raw(
+            'SELECT id, ctid FROM core_tag WHERE id = %s', [tag.id],
+        )[0].ctid, tuple_id)
+
     def test_create_tag_on_update(self):
         """Test creating a tag when updating a recipe."""
         recipe = create_recipe(user=self.user)
@@ -291,6 +427,52 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.tags.count(), 0)
 
+    def test_update_with_same_tags_writes_no_links(self):
+        """Test resending unchanged tags does not rewrite link rows."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Breakfast'),
+            Tag.objects.create(user=self.user, name='Vegan'),
+        )
+        through_table = Recipe.tags.through._meta.db_table
+
+        payload = {'tags': [{'name': 'Vegan'}, {'name': 'Breakfast'}]}
+        url = detail_url(recipe.id)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [
+            q['sql'] for q in ctx.captured_queries
+            if through_table in q['sql']
+            and q['sql'].startswith(('INSERT', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(recipe.tags.count(), 2)
+
+    def test_update_tags_only_changes_difference(self):
+        """Test updating tags keeps links that are still wanted."""
+        tag_keep = Tag.objects.create(user=self.user, name='Dinner')
+        tag_drop = Tag.objects.create(user=self.user, name='Lunch')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag_keep, tag_drop)
+        link_id = Recipe.tags.through.objects.get(
+            recipe=recipe, tag=tag_keep,
+        ).id
+
+        payload = {'tags': [{'name': 'Dinner'}, {'name': 'Spicy'}]}
+        url = detail_url(recipe.id)
+        res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Dinner', 'Spicy'},
+        )
+        self.assertTrue(
+            Recipe.tags.through.objects.filter(id=link_id).exists()
+        )
+
     def test_create_recipe_with_new_ingredients(self):
         """Test creating a recipe with new ingredients"""
         payload = {
@@ -377,6 +559,44 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_create_recipe_tag_queries_do_not_scale(self):
+        """Test nested tags and ingredients are resolved in bulk."""
+        def post_recipe(count):
+            payload = {
+                'title': f'Recipe {count}',
+                'time_minutes': 10,
+                'price': Decimal('1.00'),
+                'tags': [{'name': f'Tag {i}'} for i in range(count)],
+                'ingredients': [
+                    {'name': f'Ingredient {i}'} for i in range(count)
+                ],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(post_recipe(2), post_recipe(30))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 30)
+
+    def test_create_recipe_with_duplicate_tag_names(self):
+        """Test repeated tag names in a payload create a single tag."""
+        payload = {
+            'title': 'Ramen',
+            'time_minutes': 40,
+            'price': Decimal('8.00'),
+            'tags': [{'name': 'Japanese'}, {'name': 'Japanese'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Japanese').count(),
+            1,
+        )
+
     def test_filter_by_tags(self):
         """Test filtering recipes by tags."""
         r1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
@@ -393,9 +613,9 @@ class PrivateRecipeAPITests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients."""
@@ -413,9 +633,752 @@ class PrivateRecipeAPITests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_by_tags_mode_all(self):
+        """Test filtering recipes having all of the given tags."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        r1 = create_recipe(user=self.user, title='Salad')
+        r1.tags.add(tag1, tag2)
+        r2 = create_recipe(user=self.user, title='Stew')
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'tags_mode': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_filter_by_ingredients_mode_none(self):
+        """Test filtering recipes having none of the given ingredients."""
+        in1 = Ingredient.objects.create(user=self.user, name='Peanuts')
+        r1 = create_recipe(user=self.user, title='Satay')
+        r1.ingredients.add(in1)
+        r2 = create_recipe(user=self.user, title='Soup')
+
+        params = {'ingredients': f'{in1.id}', 'ingredients_mode': 'none'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r2.id])
+
+    def test_filter_any_returns_unique_recipes(self):
+        """Test a recipe matching several tags is returned once."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipe.id])
+
+    def test_filter_invalid_ids_bad_request(self):
+        """Test non-integer filter IDs return a bad request."""
+        res = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+
+    def test_filter_invalid_mode_bad_request(self):
+        """Test an unknown filter mode returns a bad request."""
+        res = self.client.get(
+            RECIPES_URL,
+            {'ingredients': '1', 'ingredients_mode': 'most'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ingredients_mode', res.data)
+
+    def test_filter_by_price_and_time_ranges(self):
+        """Test filtering recipes by price and time ranges."""
+        create_recipe(self.user, title='Cheap', price=Decimal('3.00'))
+        create_recipe(
+            self.user, title='Quick', price=Decimal('8.50'), time_minutes=10,
+        )
+        create_recipe(
+            self.user, title='Slow', price=Decimal('9.00'), time_minutes=90,
+        )
+        create_recipe(self.user, title='Dear', price=Decimal('25.00'))
+
+        res = self.client.get(
+            RECIPES_URL, {'price_min': '5', 'price_max': '10.00'},
+        )
+        self.assertEqual(
+            [r['title'] for r in res.data['results']], ['Slow', 'Quick'],
+        )
+
+        res = self.client.get(
+            RECIPES_URL, {'price_min': '5', 'time_max': '15'},
+        )
+        self.assertEqual([r['title'] for r in res.data['results']], ['Quick'])
+
+    def test_order_recipes(self):
+        """Test ordering recipes by price, time or title."""
+        create_recipe(
+            self.user, title='B', price=Decimal('2.00'), time_minutes=30,
+        )
+        create_recipe(
+            self.user, title='C', price=Decimal('1.00'), time_minutes=20,
+        )
+        create_recipe(
+            self.user, title='A', price=Decimal('3.00'), time_minutes=10,
+        )
+
+        for ordering, titles in [
+            ('price', ['C', 'B', 'A']),
+            ('time_minutes', ['A', 'C', 'B']),
+            ('title', ['A', 'B', 'C']),
+        ]:
+            res = self.client.get(RECIPES_URL, {'ordering': ordering})
+            self.assertEqual(
+                [r['title'] for r in res.data['results']], titles,
+            )
+
+    def test_ordered_pages_follow_each_other(self):
+        """Test cursor pages continue in the requested ordering."""
+        for i in range(5):
+            create_recipe(
+                self.user, title=f'Recipe {i}', price=Decimal(i % 2),
+            )
+
+        titles = []
+        params = {'ordering': 'price', 'page_size': 2}
+        url = RECIPES_URL
+        while url:
+            res = self.client.get(url, params)
+            titles += [r['title'] for r in res.data['results']]
+            url, params = res.data['next'], None
+
+        self.assertEqual(
+            titles,
+            ['Recipe 0', 'Recipe 2', 'Recipe 4', 'Recipe 1', 'Recipe 3'],
+        )
+
+    def test_range_filters_use_indexes(self):
+        """Test range filters with their ordering scan the composite indexes.
+
+        Sequential and bitmap scans and sorts are discouraged because the
+        planner prefers them on a test sized table; an ordered index scan
+        must still serve both the range and the ordering.
+        """
+        for i in range(20):
+            create_recipe(
+                self.user, price=Decimal(i), time_minutes=5 * i,
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+
+        for params, ordering, index in [
+            ({'price_min': '5', 'price_max': '10'}, 'price',
+             'core_recipe_user_price_idx'),
+            ({'time_max': '30'}, 'time_minutes', 'core_recipe_user_time_idx'),
+        ]:
+            queryset = filter_recipes(
+                Recipe.objects.filter(user=self.user), params,
+            ).order_by(*RECIPE_ORDERINGS[ordering])[:51]
+            plan = queryset.explain()
+            self.assertIn(index, plan)
+            self.assertNotIn('Sort', plan)
+
+    def test_tied_pages_seek_on_index(self):
+        """Test a page inside a run of equal prices seeks the index.
+
+        The page 2 query is captured from the API and explained as run,
+        the (price, id) row comparison must be the index condition and
+        no page may skip rows with an OFFSET.
+        """
+        recipes = [
+            create_recipe(self.user, price=Decimal('5.00'))
+            for _ in range(6)
+        ]
+        create_recipe(self.user, price=Decimal('1.00'))
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+        res = self.client.get(
+            RECIPES_URL, {'ordering': 'price', 'page_size': 3},
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [recipe.id for recipe in recipes[2:5]],
+        )
+        sql = next(
+            q['sql'] for q in ctx.captured_queries if 'ROW(' in q['sql']
+        )
+        self.assertNotIn('OFFSET', sql)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('core_recipe_user_price_idx', plan)
+        self.assertRegex(plan, r'Index Cond: .*ROW\(price, id\) >')
+        self.assertNotIn('Sort', plan)
+
+    def test_invalid_range_and_ordering_bad_request(self):
+        """Test malformed range bounds and orderings return bad requests."""
+        for params in [
+            {'price_min': 'cheap'},
+            {'price_max': 'NaN'},
+            {'time_min': '1.5'},
+            {'ordering': 'calories'},
+        ]:
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(next(iter(params)), res.data)
+
+    def test_search_recipes_ranked(self):
+        """Test searching ranks title matches above description matches."""
+        r1 = create_recipe(
+            user=self.user,
+            title='Lemon tart',
+            description='Sweet pastry',
+        )
+        r2 = create_recipe(
+            user=self.user,
+            title='Roast chicken',
+            description='Serve with a squeeze of lemon',
+        )
+        create_recipe(user=self.user, title='Beef stew')
+
+        res = self.client.get(RECIPES_URL, {'search': 'lemons'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r1.id, r2.id])
+
+    def test_search_recipes_by_tag_and_ingredient(self):
+        """Test search covers linked tag and ingredient names."""
+        recipe = create_recipe(user=self.user, title='Weeknight dinner')
+        tag = Tag.objects.create(user=self.user, name='Mexican')
+        ingredient = Ingredient.objects.create(user=self.user, name='Bean')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPES_URL, {'search': 'mexican'})
+        self.assertEqual(
+            [r['id'] for r in res.data['results']], [recipe.id],
+        )
+
+        ingredient.name = 'Chickpea'
+        ingredient.save()
+        res = self.client.get(RECIPES_URL, {'search': 'chickpea'})
+        self.assertEqual(
+            [r['id'] for r in res.data['results']], [recipe.id],
+        )
+
+        recipe.tags.remove(tag)
+        res = self.client.get(RECIPES_URL, {'search': 'mexican'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_recipes_limited_to_user(self):
+        """Test search only returns the authenticated user's recipes."""
+        other_user = create_user(
+            email='other@example.com', password='test123')
+        create_recipe(user=other_user, title='Pad thai')
+
+        res = self.client.get(RECIPES_URL, {'search': 'thai'})
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_recipes_paginated(self):
+        """Test ranked search results can be paged through."""
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Curry {i}')
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry', 'page_size': 2})
+        ids = [recipe['id'] for recipe in res.data['results']]
+        res = self.client.get(res.data['next'])
+        ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(len(set(ids)), 3)
+
+    def test_search_pages_through_rank_ties(self):
+        """Test search pages seek past equally ranked recipes by id."""
+        recipes = [
+            create_recipe(user=self.user, title='Curry') for _ in range(5)
+        ]
+
+        ids = []
+        url, params = RECIPES_URL, {'search': 'curry', 'page_size': 2}
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                res = self.client.get(url, params)
+                ids += [recipe['id'] for recipe in res.data['results']]
+                url, params = res.data['next'], None
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+        self.assertFalse(
+            any('OFFSET' in q['sql'] for q in ctx.captured_queries)
+        )
+        res = self.client.get(res.data['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[2].id, recipes[1].id],
+        )
+
+    def test_list_recipes_cached(self):
+        """Test repeated list requests are served from the cache."""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        # Validators come from the cache too, a hit never queries.
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data, res.data)
+
+    def test_recipe_cache_invalidated_on_write(self):
+        """Test recipe, tag and link changes invalidate cached responses."""
+        recipe = create_recipe(user=self.user, title='Old title')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        url = detail_url(recipe.id)
+        self.client.get(url)
+
+        self.client.patch(url, {'title': 'New title'})
+        res = self.client.get(url)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['title'], 'New title')
+
+        recipe.tags.add(tag)
+        res = self.client.get(url)
+        self.assertEqual(res.data['tags'], [{'id': tag.id, 'name': 'Vegan'}])
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(url)
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_recipe_cache_per_user(self):
+        """Test cached responses are not shared between users."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other_user = create_user(
+            email='other@example.com', password='test123')
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_list_recipes_not_modified(self):
+        """Test a matching If-None-Match returns 304 without a body."""
+        recipe = create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+        self.assertIn('Last-Modified', res)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_recipe_detail_if_modified_since(self):
+        """Test If-Modified-Since on a recipe detail."""
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        res = self.client.get(url)
+
+        res = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'],
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_recipe_etag_changes_on_delete(self):
+        """Test deleting a recipe changes the list validator."""
+        create_recipe(user=self.user)
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        self.client.delete(detail_url(recipe.id))
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_validators_survive_lost_cache(self):
+        """Test validators lost with the cache restart once and then hold."""
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        caches['default'].clear()
+        response_cache.local.clear()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag, last_modified = res['ETag'], res['Last-Modified']
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_retrieve_invalid_id_not_found(self):
+        """Test malformed and unknown recipe IDs are 404s, not errors."""
+        for recipe_id in ['abc', 0]:
+            res = self.client.get(
+                detail_url(recipe_id), HTTP_IF_NONE_MATCH='*',
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_stats_admin_only(self):
+        """Test cache statistics are only available to staff users."""
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('misses', res.data)
+        self.assertIn('local_hits', res.data)
+
+    def test_list_sparse_fields(self):
+        """Test ?fields= trims the output, columns and prefetches."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Tag'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title,price'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(res.data['results'][0]),
+            ['id', 'title', 'price'],
+        )
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('core_recipe_tags', sql)
+        self.assertNotIn('"core_recipe"."link"', sql)
+
+    def test_list_omit_fields(self):
+        """Test ?omit= leaves fields and their prefetches out."""
+        create_recipe(user=self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'omit': 'ingredients'})
+
+        self.assertEqual(
+            list(res.data['results'][0]),
+            ['id', 'title', 'time_minutes', 'price', 'link', 'tags'],
+        )
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertIn('core_recipe_tags', sql)
+        self.assertNotIn('core_recipe_ingredients', sql)
+
+    def test_detail_sparse_fields(self):
+        """Test ?fields= applies to recipe details."""
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.get(
+            detail_url(recipe.id), {'fields': 'title,description'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,
+            {'title': recipe.title, 'description': recipe.description},
+        )
+
+    def test_sparse_fields_invalid(self):
+        """Test unknown or empty field selections return 400."""
+        for params in [
+            {'fields': 'title,secret'},
+            {'omit': 'nope'},
+            {'fields': 'id', 'omit': 'id'},
+        ]:
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facets(self):
+        """Test facet counts of the filtered recipes in three queries."""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        r1 = create_recipe(self.user, price=Decimal('4.99'), time_minutes=10)
+        r2 = create_recipe(self.user, price=Decimal('12.00'), time_minutes=45)
+        r3 = create_recipe(self.user, price=Decimal('80.00'), time_minutes=200)
+        r1.tags.add(vegan, quick)
+        r2.tags.add(vegan)
+        r3.tags.add(quick)
+        r1.ingredients.add(salt)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(FACETS_URL, {'tags': str(vegan.id)})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(
+            [(tag['name'], tag['count']) for tag in res.data['tags']],
+            [('Vegan', 2), ('Quick', 1)],
+        )
+        self.assertEqual(
+            res.data['ingredients'],
+            [{'id': salt.id, 'name': 'Salt', 'count': 1}],
+        )
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['price']],
+            [1, 0, 1, 0, 0],
+        )
+        self.assertEqual(res.data['price'][1]['min'], '5.00')
+        self.assertIsNone(res.data['price'][-1]['max'])
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['time_minutes']],
+            [1, 0, 1, 0, 0],
+        )
+
+        with self.assertNumQueries(0):
+            res = self.client.get(FACETS_URL, {'tags': str(vegan.id)})
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_pantry_ranks_by_coverage(self):
+        """Test pantry search ranks makeable recipes first."""
+        salt, eggs, flour, milk = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'Eggs', 'Flour', 'Milk')
+        ]
+        omelette = create_recipe(self.user, title='Omelette')
+        omelette.ingredients.add(salt, eggs)
+        pancakes = create_recipe(self.user, title='Pancakes')
+        pancakes.ingredients.add(eggs, flour, milk)
+        bread = create_recipe(self.user, title='Bread')
+        bread.ingredients.add(flour, salt, milk)
+        create_recipe(self.user, title='Water')
+        pantry = f'{salt.id},{eggs.id},{flour.id}'
+
+        res = self.client.get(PANTRY_URL, {'pantry': pantry})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (r['title'], r['matched'], r['missing'])
+                for r in res.data['results']
+            ],
+            [('Omelette', 2, 0), ('Bread', 2, 1), ('Pancakes', 2, 1)],
+        )
+
+        res = self.client.get(
+            PANTRY_URL, {'pantry': pantry, 'max_missing': 0},
+        )
+        self.assertEqual(
+            [r['title'] for r in res.data['results']],
+            ['Omelette'],
+        )
+
+    def test_pantry_pages_seek_through_ties(self):
+        """Test pantry pages continue among recipes missing as many."""
+        salt, eggs = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'Eggs')
+        ]
+        recipes = []
+        for i in range(5):
+            recipe = create_recipe(self.user, title=f'Recipe {i}')
+            recipe.ingredients.add(salt, eggs)
+            recipes.append(recipe)
+        makeable = recipes[3]
+        makeable.ingredients.remove(eggs)
+        pantry = f'{salt.id}'
+
+        ids = []
+        url, params = PANTRY_URL, {'pantry': pantry, 'page_size': 2}
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                res = self.client.get(url, params)
+                ids += [r['id'] for r in res.data['results']]
+                url, params = res.data['next'], None
+
+        self.assertEqual(ids, [makeable.id] + [
+            recipe.id for recipe in reversed(recipes) if recipe != makeable
+        ])
+        self.assertFalse(
+            any('OFFSET' in q['sql'] for q in ctx.captured_queries)
+        )
+
+    def test_pantry_requires_valid_ids(self):
+        """Test pantry search rejects missing or malformed pantries."""
+        for params in [
+            {},
+            {'pantry': 'salt'},
+            {'pantry': '1', 'max_missing': '-1'},
+        ]:
+            res = self.client.get(PANTRY_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar_recipes(self):
+        """Test similar recipes share tags and ingredients."""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        eggs, milk, rice = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Eggs', 'Milk', 'Rice')
+        ]
+        omelette = create_recipe(self.user, title='Omelette')
+        omelette.tags.add(tag)
+        omelette.ingredients.add(eggs, milk)
+        scramble = create_recipe(self.user, title='Scramble')
+        scramble.tags.add(tag)
+        scramble.ingredients.add(eggs, milk)
+        create_recipe(self.user, title='Risotto').ingredients.add(rice)
+        create_recipe(self.user, title='Water')
+        other = create_recipe(create_user(email='other@example.com'))
+        other.ingredients.add(
+            Ingredient.objects.create(user=other.user, name='Eggs'),
+        )
+
+        res = self.client.get(similar_url(omelette.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r['title'], r['similarity']) for r in res.data],
+            [('Scramble', 1.0)],
+        )
+
+        scramble.ingredients.set([rice])
+        scramble.tags.clear()
+        res = self.client.get(similar_url(omelette.id))
+        self.assertEqual(res.data, [])
+
+    def test_shopping_list(self):
+        """Test the shopping list merges ingredients of many recipes."""
+        eggs, milk, rice = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Eggs', 'Milk', 'Rice')
+        ]
+        omelette = create_recipe(self.user, price=Decimal('4.00'))
+        omelette.ingredients.add(eggs, milk)
+        pancakes = create_recipe(self.user, price=Decimal('9.00'))
+        pancakes.ingredients.add(eggs, milk, rice)
+        risotto = create_recipe(self.user, price=Decimal('6.00'))
+        risotto.ingredients.add(rice)
+        toast = create_recipe(self.user, price=Decimal('2.50'))
+        other = create_recipe(create_user(email='other@example.com'))
+        other.ingredients.add(
+            Ingredient.objects.create(user=other.user, name='Salt'),
+        )
+        recipe_ids = [omelette.id, pancakes.id, toast.id, other.id]
+
+        with self.assertNumQueries(2):
+            data = get_shopping_list(Recipe.objects.filter(
+                user=self.user, id__in=recipe_ids,
+            ))
+        res = self.client.get(
+            SHOPPING_LIST_URL,
+            {'recipes': ','.join(str(pk) for pk in recipe_ids)},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, data)
+        self.assertEqual(res.data['total_price'], '15.50')
+        self.assertEqual(
+            [
+                (item['name'], item['recipe_count'], item['estimated_price'])
+                for item in res.data['ingredients']
+            ],
+            [('Eggs', 2, '5.00'), ('Milk', 2, '5.00'), ('Rice', 1, '3.00')],
+        )
+
+    def test_shopping_list_requires_recipes(self):
+        """Test the shopping list rejects missing or malformed IDs."""
+        for params in [{}, {'recipes': 'soup'}]:
+            res = self.client.get(SHOPPING_LIST_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar_recipes_of_other_user_not_found(self):
+        """Test similar recipes of another user's recipe are not found."""
+        other = create_recipe(create_user(email='other@example.com'))
+
+        res = self.client.get(similar_url(other.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeQueryBudgetTests(TestCase):
+    """Test recipe reads run a constant number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        # More rows, tags and ingredients than any budget allows queries.
+        for i in range(2 * max(RecipeViewSet.query_budgets.values())):
+            self.recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            self.recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}')
+            )
+            self.recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Item {i}')
+            )
+
+    def assertWithinBudget(self, action, url):
+        """Assert a read runs exactly the queries its view budgets."""
+        with self.assertNumQueries(RecipeViewSet.query_budgets[action]):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_list_within_budget(self):
+        """Test listing recipes stays within the list budget."""
+        res = self.assertWithinBudget('list', RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), Recipe.objects.count())
+
+    def test_detail_within_budget(self):
+        """Test retrieving a recipe stays within the detail budget."""
+        res = self.assertWithinBudget('retrieve', detail_url(self.recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_facets_within_budget(self):
+        """Test recipe facets stay within the facets budget."""
+        res = self.assertWithinBudget('facets', FACETS_URL)
+
+        self.assertEqual(len(res.data['tags']), Tag.objects.count())
+
+    @override_settings(QUERY_BUDGET=0)
+    def test_over_budget_fails(self):
+        """Test a view budget applies even without a global budget."""
+        budgets = {**RecipeViewSet.query_budgets, 'list': 1}
+
+        with patch.object(RecipeViewSet, 'query_budgets', budgets):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(RECIPES_URL)
 
 
 class ImageUploadTests(TestCase):
@@ -431,6 +1394,9 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for variant in self.recipe.image_variants:
+            default_storage.delete(variant['name'])
         self.recipe.image.delete()
 
     def test_upload_image(self):
@@ -448,6 +1414,104 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_upload_image_generates_variants(self):
+        """Test uploads get resized, metadata free image variants."""
+        url = image_upload_url(self.recipe.id)
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera'
+        exif[0x0112] = 6
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (1000, 600)).save(
+                image_file, format='JPEG', exif=exif,
+            )
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    url, {'image': image_file}, format='multipart',
+                )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(detail_url(self.recipe.id))
+        variants = res.data['image_variants']
+        self.assertEqual(
+            [(v['width'], v['format']) for v in variants],
+            [
+                (width, fmt)
+                for width in [200, 400, 600]
+                for fmt in ['webp', 'jpeg']
+            ],
+        )
+        self.recipe.refresh_from_db()
+        base = os.path.splitext(self.recipe.image.name)[0]
+        for variant, stored in zip(variants, self.recipe.image_variants):
+            self.assertTrue(variant['url'].startswith('http://testserver/'))
+            self.assertTrue(stored['name'].startswith(base))
+            with default_storage.open(stored['name']) as variant_file:
+                img = Image.open(variant_file)
+                self.assertEqual(img.format, variant['format'].upper())
+                self.assertEqual(img.width, variant['width'])
+                self.assertEqual(img.height, round(variant['width'] * 10 / 6))
+                self.assertEqual(len(img.getexif()), 0)
+                if img.format == 'JPEG':
+                    self.assertTrue(img.info.get('progressive'))
+
+    def test_upload_image_resets_variants(self):
+        """Test variants of a replaced image are deleted after commit."""
+        name = default_storage.save('uploads/recipe/old_200.webp', io.BytesIO(
+            b'old',
+        ))
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image_variants=[{'width': 200, 'format': 'webp', 'name': name}],
+        )
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post(
+                    url, {'image': image_file}, format='multipart',
+                )
+            self.assertTrue(default_storage.exists(name))
+            callbacks[0]()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, [])
+        self.assertFalse(default_storage.exists(name))
+
+    def test_variants_keep_transparency(self):
+        """Test transparent images keep alpha in webp, white in jpeg."""
+        buffer = io.BytesIO()
+        image = Image.new('RGBA', (300, 100), (0, 0, 0, 0))
+        image.paste((0, 0, 255, 255), (150, 0, 300, 100))
+        image.save(buffer, format='PNG')
+
+        variants = {
+            (width, fmt): Image.open(io.BytesIO(data))
+            for width, fmt, data in render_variants(buffer)
+        }
+
+        webp = variants[(200, 'webp')]
+        self.assertEqual(webp.mode, 'RGBA')
+        self.assertEqual(webp.getpixel((10, 50))[3], 0)
+        self.assertEqual(webp.getpixel((190, 50))[3], 255)
+        jpeg = variants[(200, 'jpeg')].convert('RGB')
+        self.assertTrue(all(c > 240 for c in jpeg.getpixel((10, 50))))
+        red, green, blue = jpeg.getpixel((190, 50))
+        self.assertTrue(blue > 200 and red < 40 and green < 40)
+
+    def test_variants_skip_formats_without_encoder(self):
+        """Test webp variants are skipped when Pillow can't write them."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+        variant_formats.cache_clear()
+        self.addCleanup(variant_formats.cache_clear)
+
+        with patch('recipe.images.features.check', return_value=False):
+            variants = list(render_variants(buffer))
+
+        self.assertEqual([fmt for _, fmt, _ in variants], ['jpeg'])
+
     def test_upload_image_bad_request(self):
         """Test uploading invalid image."""
         url = image_upload_url(self.recipe.id)
@@ -455,3 +1519,302 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_read_serializers_render_identically(self):
+        """Test the planned read serializers match the model serializers."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            self.client.post(url, {'image': image_file}, format='multipart')
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Tag'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'),
+        )
+        create_recipe(user=self.user, price=Decimal('7'), link='')
+        recipes = Recipe.objects.prefetch_related('tags', 'ingredients')
+        context = {'request': APIRequestFactory().get(RECIPES_URL)}
+
+        for model_serializer, read_serializer in [
+            (RecipeSerializer, RecipeReadSerializer),
+            (RecipeDetailSerializer, RecipeDetailReadSerializer),
+        ]:
+            expected = JSONRenderer().render(
+                model_serializer(recipes, many=True, context=context).data
+            )
+            rendered = JSONRenderer().render(
+                read_serializer(recipes, many=True, context=context).data
+            )
+            self.assertEqual(rendered, expected)
+
+
+class ResumableImageUploadTests(TestCase):
+    """Tests for the resumable chunked image upload API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(buffer, format='JPEG')
+        self.data = buffer.getvalue()
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+
+    def tearDown(self):
+        ImageUpload.objects.all().delete()
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            self.recipe.image.delete()
+
+    def _start(self, **params):
+        payload = {'filename': 'photo.jpg', 'size': len(self.data)}
+        payload.update(params)
+        return self.client.post(image_uploads_url(self.recipe.id), payload)
+
+    def _put(self, upload_id, start, end, data=None):
+        return self.client.put(
+            image_upload_session_url(self.recipe.id, upload_id),
+            self.data[start:end + 1] if data is None else data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.data)}',
+        )
+
+    def _finalize(self, upload_id, sha256):
+        return self.client.post(
+            image_upload_session_url(self.recipe.id, upload_id, True),
+            {'sha256': sha256},
+        )
+
+    def test_chunked_upload(self):
+        """Test an image sent in retried chunks becomes the recipe image."""
+        res = self._start()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['offset'], 0)
+        upload_id = res.data['id']
+        size = len(self.data)
+
+        self.assertEqual(self._put(upload_id, 0, 199).data['offset'], 200)
+        self.assertEqual(self._put(upload_id, 100, 399).data['offset'], 400)
+        self.assertEqual(self._put(upload_id, 0, 99).data['offset'], 400)
+        res = self.client.get(image_upload_session_url(
+            self.recipe.id, upload_id,
+        ))
+        self.assertEqual(res.data['offset'], 400)
+        res = self._put(upload_id, 400, size - 1)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], size)
+        path = part_path(ImageUpload.objects.get(id=upload_id))
+        res = self._finalize(upload_id, self.sha256.upper())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.jpg'))
+        with open(self.recipe.image.path, 'rb') as image_file:
+            self.assertEqual(image_file.read(), self.data)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_chunk_past_offset_rejected(self):
+        """Test a chunk leaving a gap is refused with the offset to resume."""
+        upload_id = self._start().data['id']
+        self._put(upload_id, 0, 99)
+
+        res = self._put(upload_id, 200, 299)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 100)
+
+    def test_short_chunk_keeps_received_bytes(self):
+        """Test a chunk cut short counts the bytes that did arrive."""
+        upload_id = self._start().data['id']
+        upload = ImageUpload.objects.get(id=upload_id)
+
+        written = write_chunk(upload, io.BytesIO(self.data[:50]), 0, 100)
+
+        self.assertEqual(written, 50)
+        self.assertEqual(upload.offset, 50)
+        with open(part_path(upload), 'rb') as part:
+            self.assertEqual(part.read(), self.data[:50])
+
+    def test_chunk_written_under_session_lock(self):
+        """Test chunks lock the session finalize locks before moving it."""
+        upload_id = self._start().data['id']
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self._put(upload_id, 0, 99)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(any(
+            'FOR UPDATE' in query['sql'] for query in queries.captured_queries
+        ))
+
+    def test_chunk_received_outside_transaction(self):
+        """Test a slow client's body is read without holding the lock."""
+        upload_id = self._start().data['id']
+        depth = len(connection.savepoint_ids)
+        depths = []
+
+        class Recorder:
+            def __init__(self, stream):
+                self.stream = stream
+
+            def read(self, size=-1):
+                depths.append(len(connection.savepoint_ids))
+                return self.stream.read(size)
+
+        with patch.object(
+            ChunkParser, 'parse', lambda parser, stream, *args: Recorder(
+                stream,
+            ),
+        ):
+            res = self._put(upload_id, 0, 99)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], 100)
+        self.assertEqual(set(depths), {depth})
+
+    def test_missing_part_file_not_found(self):
+        """Test an upload whose data is gone answers 404, not 500."""
+        upload_id = self._start().data['id']
+        self._put(upload_id, 0, len(self.data) - 1)
+        os.remove(part_path(ImageUpload.objects.get(id=upload_id)))
+
+        res = self._put(upload_id, 0, 99)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self._finalize(upload_id, self.sha256)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bad_chunks_rejected(self):
+        """Test malformed ranges and bodies are refused."""
+        upload_id = self._start().data['id']
+        url = image_upload_session_url(self.recipe.id, upload_id)
+        size = len(self.data)
+
+        for content_range in [
+            None, 'bytes 0-99/1', f'bytes 0-{size}/{size}',
+            f'bytes 50-10/{size}',
+        ]:
+            headers = {}
+            if content_range:
+                headers['HTTP_CONTENT_RANGE'] = content_range
+            res = self.client.put(
+                url, self.data[:100],
+                content_type='application/octet-stream', **headers,
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self._put(upload_id, 0, 99, data=self.data[:90])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.put(
+            url, b'x', content_type='text/plain',
+            HTTP_CONTENT_RANGE=f'bytes 0-0/{size}',
+        )
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        )
+        self.assertEqual(ImageUpload.objects.get().offset, 0)
+
+    def test_finalize_checks_checksum(self):
+        """Test a checksum mismatch rewinds the upload."""
+        upload_id = self._start().data['id']
+        self._put(upload_id, 0, len(self.data) - 1)
+
+        res = self._finalize(upload_id, '0' * 64)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ImageUpload.objects.get().offset, 0)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_finalize_incomplete_upload(self):
+        """Test finalizing before all bytes arrived is refused."""
+        upload_id = self._start().data['id']
+        self._put(upload_id, 0, 99)
+
+        res = self._finalize(upload_id, self.sha256)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 100)
+
+    def test_finalize_rejects_non_image(self):
+        """Test data that is not an image is discarded."""
+        self.data = b'not an image' * 10
+        upload_id = self._start().data['id']
+        self._put(upload_id, 0, len(self.data) - 1)
+
+        res = self._finalize(
+            upload_id, hashlib.sha256(self.data).hexdigest(),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_start_upload_validates(self):
+        """Test uploads need an image extension and a bounded size."""
+        for params in [
+            {'filename': 'notes.txt'},
+            {'size': 0},
+            {'size': 10 ** 12},
+        ]:
+            res = self._start(**params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_cancel_upload(self):
+        """Test deleting an upload removes its partial data."""
+        upload_id = self._start().data['id']
+        self._put(upload_id, 0, 99)
+        path = part_path(ImageUpload.objects.get(id=upload_id))
+
+        res = self.client.delete(
+            image_upload_session_url(self.recipe.id, upload_id),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(os.path.exists(path))
+
+    def test_uploads_of_other_users_not_found(self):
+        """Test upload sessions are private to the recipe owner."""
+        upload_id = self._start().data['id']
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'password123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self._put(upload_id, 0, 99)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self._finalize(upload_id, self.sha256)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(IMAGE_UPLOAD_EXPIRY=0)
+    def test_expired_uploads_removed(self):
+        """Test expired uploads can't be resumed and are cleaned up."""
+        upload_id = self._start().data['id']
+        path = part_path(ImageUpload.objects.get(id=upload_id))
+
+        res = self._put(upload_id, 0, 99)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self._start()
+        self.assertEqual(ImageUpload.objects.count(), 1)
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(IMAGE_UPLOAD_MAX_ACTIVE=2)
+    def test_active_uploads_capped(self):
+        """Test a user can't hold more unfinished uploads than the cap."""
+        upload_id = self._start().data['id']
+        self._start()
+
+        res = self._start()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ImageUpload.objects.count(), 2)
+        self.client.delete(image_upload_session_url(self.recipe.id, upload_id))
+        res = self._start()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
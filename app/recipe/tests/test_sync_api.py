@@ -0,0 +1,189 @@
+"""
+Tests for the delta sync API.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+)
+from recipe.sync import encode_token, prune_tombstones
+
+
+CHANGES_URL = reverse('recipe:changes')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicSyncApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to sync."""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@patch('recipe.sync.SYNC_LAG', timedelta(0))
+class PrivateSyncApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_full_sync(self):
+        """Test syncing without a token returns everything."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        create_recipe(user=other_user)
+
+        res = self.client.get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual(res.data['recipes'][0]['tags'][0]['name'], 'Vegan')
+        self.assertEqual([t['id'] for t in res.data['tags']], [tag.id])
+        self.assertIn('next', res.data)
+
+    def test_delta_sync(self):
+        """Test syncing with a token returns only changes and tombstones."""
+        kept = create_recipe(user=self.user, title='Kept')
+        removed = create_recipe(user=self.user, title='Removed')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        token = self.client.get(CHANGES_URL).data['next']
+
+        removed_id = removed.id
+        removed.delete()
+        ingredient.name = 'Sea salt'
+        ingredient.save()
+        added = create_recipe(user=self.user, title='Added')
+        res = self.client.get(CHANGES_URL, {'since': token})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in res.data['recipes']]
+        self.assertEqual(ids, [added.id])
+        self.assertNotIn(kept.id, ids)
+        self.assertEqual(res.data['deleted']['recipes'], [removed_id])
+        self.assertEqual(
+            [i['name'] for i in res.data['ingredients']],
+            ['Sea salt'],
+        )
+
+    def _sync(self, params):
+        """Fetch every page of a sync, returning the response data."""
+        pages = []
+        while True:
+            res = self.client.get(CHANGES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data)
+            if not res.data['more']:
+                return pages
+            params = {'since': res.data['next']}
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_sync_paged_through_ties(self):
+        """Test pages seek on (updated_at, id) past rows changed together."""
+        recipes = [
+            create_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(5)
+        ]
+        Recipe.objects.filter(user=self.user).update(
+            updated_at=timezone.now() - timedelta(seconds=1),
+        )
+        Tag.objects.create(user=self.user, name='Vegan')
+        full = self._sync({})
+        ids = [recipe.id for recipe in recipes]
+        for recipe in recipes[:3]:
+            recipe.delete()
+        Recipe.objects.filter(user=self.user).update(
+            updated_at=timezone.now(),
+        )
+
+        pages = self._sync({'since': full[-1]['next']})
+
+        self.assertEqual(
+            [r['id'] for page in full for r in page['recipes']], ids,
+        )
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(
+            [r['id'] for page in pages for r in page['recipes']], ids[3:],
+        )
+        self.assertEqual(
+            [i for page in pages for i in page['deleted']['recipes']],
+            ids[:3],
+        )
+        res = self.client.get(CHANGES_URL, {'since': pages[-1]['next']})
+        self.assertEqual(res.data['recipes'], [])
+        self.assertFalse(res.data['more'])
+
+    def test_old_token_requires_full_sync(self):
+        """Test tokens older than the tombstone retention are refused."""
+        token = encode_token(timezone.now() - timedelta(days=31))
+
+        res = self.client.get(CHANGES_URL, {'since': token})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+        self.assertEqual(res.data['detail'].code, 'resync_required')
+
+    def test_prune_tombstones(self):
+        """Test tombstones past the retention are deleted."""
+        recipe = create_recipe(user=self.user)
+        recipe.delete()
+        Tombstone.objects.create(user=self.user, model='tag', object_id=1)
+        Tombstone.objects.filter(model='recipe').update(
+            deleted_at=timezone.now() - timedelta(days=31),
+        )
+
+        self.assertEqual(prune_tombstones(), 1)
+        self.assertEqual(
+            list(Tombstone.objects.values_list('model', flat=True)),
+            ['tag'],
+        )
+
+    def test_invalid_token(self):
+        """Test a malformed token returns a bad request."""
+        res = self.client.get(CHANGES_URL, {'since': 'not-a-token'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete_user_with_recipes(self):
+        """Test deleting a user does not log tombstones for it."""
+        create_recipe(user=self.user)
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        self.user.delete()
+
+        self.assertFalse(Recipe.objects.exists())
@@ -4,8 +4,10 @@ Tests for the tags API."""
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -19,6 +21,7 @@ from recipe.serializers import TagSerializer
 
 
 TAGS_URL = reverse('recipe:tag-list')
+SUGGEST_URL = reverse('recipe:tag-suggest')
 
 
 def detail_url(tag_id):
@@ -62,7 +65,36 @@ class PrviateTagsApiTests(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_tags_cursor_paginated(self):
+        """Test tags are paginated by name with an opaque cursor."""
+        for name in ['Brunch', 'Asian', 'Curry']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['Curry', 'Brunch'])
+
+        res = self.client.get(res.data['next'])
+
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['Asian'])
+
+    def test_tags_not_modified(self):
+        """Test tag lists answer conditional requests."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
 
     def test_tags_limited_to_user(self):
         """Test list of tags is limited to authenticated user."""
@@ -73,9 +105,9 @@ class PrviateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_update_tag(self):
         """Test updating a tag"""
@@ -89,6 +121,20 @@ class PrviateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_to_existing_name_fails(self):
+        """Test renaming a tag to another tag's name in any case fails."""
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After Dinner')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'DESSERT'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'after dinner'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_delte_tag(self):
         """Test deleting a tag."""
         tag = Tag.objects.create(user=self.user, name='Breakfast')
@@ -112,13 +158,14 @@ class PrviateTagsApiTests(TestCase):
         )
 
         recipe.tags.add(tag1)
+        tag1.refresh_from_db()
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtered_tags_unique(self):
         """Test filtered tags returns unique list"""
@@ -141,4 +188,121 @@ class PrviateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_suggest_tags_prefix_first(self):
+        """Test suggestions rank prefix matches before fuzzy ones."""
+        Tag.objects.create(user=self.user, name='Sweet Potato')
+        Tag.objects.create(user=self.user, name='Potatoes')
+        Tag.objects.create(user=self.user, name='Pasta')
+
+        res = self.client.get(SUGGEST_URL, {'q': 'potato'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in res.data]
+        self.assertEqual(names, ['Potatoes', 'Sweet Potato'])
+
+    def test_suggest_tags_short_prefix_and_limit(self):
+        """Test short queries match prefixes and respect the limit."""
+        for name in ['Brunch', 'Breakfast', 'Bread', 'Dinner']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(SUGGEST_URL, {'q': 'br', 'limit': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in res.data]
+        self.assertEqual(names, ['Bread', 'Breakfast'])
+
+    def test_suggest_tags_limited_to_user(self):
+        """Test suggestions only include the user's own tags."""
+        user2 = create_user(email='user2@example.com')
+        Tag.objects.create(user=user2, name='Vegan')
+
+        res = self.client.get(SUGGEST_URL, {'q': 'vegan'})
+
+        self.assertEqual(res.data, [])
+
+    def test_suggest_tags_requires_query(self):
+        """Test suggestions need a query and a valid limit."""
+        res = self.client.get(SUGGEST_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(SUGGEST_URL, {'q': 'veg', 'limit': 'all'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_tags_sparse_fields(self):
+        """Test ?fields= trims the tag list output."""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'name': 'Vegan'}])
+
+    def test_list_tags_ordered_by_usage(self):
+        """Test ordering tags by their number of recipes."""
+        rare = Tag.objects.create(user=self.user, name='Rare')
+        common = Tag.objects.create(user=self.user, name='Common')
+        Tag.objects.create(user=self.user, name='Unused')
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('5.00'),
+                user=self.user,
+            )
+            recipe.tags.add(common)
+        recipe.tags.add(rare)
+
+        res = self.client.get(TAGS_URL, {'ordering': 'usage'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count'])
+             for tag in res.data['results']],
+            [('Common', 2), ('Rare', 1), ('Unused', 0)],
+        )
+
+        res = self.client.get(TAGS_URL, {'ordering': 'popular'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_usage_pages_seek_through_equal_counts(self):
+        """Test usage pages continue by id among tags of equal count."""
+        tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(5)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Tag._meta.db_table}')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+        ids = []
+        url, params = TAGS_URL, {'ordering': 'usage', 'page_size': 2}
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                res = self.client.get(url, params)
+                ids += [tag['id'] for tag in res.data['results']]
+                url, params = res.data['next'], None
+
+        self.assertEqual(ids, [tag.id for tag in reversed(tags)])
+        sql = next(
+            q['sql'] for q in ctx.captured_queries if 'ROW(' in q['sql']
+        )
+        self.assertNotIn('OFFSET', sql)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('core_tag_user_count_idx', plan)
+        self.assertRegex(plan, r'Index Cond: .*ROW\(recipe_count, id\) <')
+        self.assertNotIn('Sort', plan)
+
+    def test_assigned_only_needs_no_join(self):
+        """Test assigned_only filters on the counter, without a join."""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('recipe_count', sql)
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('DISTINCT', sql)
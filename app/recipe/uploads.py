@@ -0,0 +1,239 @@
+"""
+Resumable chunked uploads of recipe images.
+"""
+import hashlib
+import hmac
+import os
+import re
+import tempfile
+from datetime import timedelta
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import BaseParser
+from rest_framework.settings import api_settings
+
+from core.models import ImageUpload, recipe_image_file_path
+from recipe.images import discard_image_variants
+
+
+CHUNK_BUFFER_SIZE = 64 * 1024
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class ChunkParser(BaseParser):
+    """Parser handing the raw request stream of a chunk to the view."""
+    media_type = 'application/octet-stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream
+
+
+def parse_content_range(value, size):
+    """Return (start, length) of a Content-Range header, or None."""
+    match = CONTENT_RANGE_RE.match(value or '')
+    if match is None:
+        return None
+    start, end, total = map(int, match.groups())
+    if total != size or start > end or end >= size:
+        return None
+
+    return start, end - start + 1
+
+
+def part_path(upload):
+    """Return the path of the file an upload's chunks are written to."""
+    return default_storage.path(
+        os.path.join('uploads', 'partial', str(upload.id))
+    )
+
+
+def _open_part(upload, mode):
+    try:
+        return open(part_path(upload), mode)
+    except FileNotFoundError:
+        raise NotFound('The data of this upload is gone.')
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(seconds=settings.IMAGE_UPLOAD_EXPIRY)
+
+
+def active_uploads(user):
+    """Return the user's upload sessions that have not expired."""
+    return ImageUpload.objects.filter(
+        recipe__user=user, created_at__gte=_expiry_cutoff(),
+    )
+
+
+def start_upload(recipe, filename, size):
+    """Create an upload session with an empty part file.
+
+    Expired sessions of the recipe's owner are removed on the way, and
+    owners holding IMAGE_UPLOAD_MAX_ACTIVE unfinished sessions are refused
+    until one is finished, cancelled or expires.
+    """
+    with transaction.atomic():
+        # Lock the owner so concurrent starts can't both pass the cap.
+        get_user_model().objects.select_for_update().filter(
+            pk=recipe.user_id,
+        ).exists()
+        ImageUpload.objects.filter(
+            recipe__user=recipe.user_id, created_at__lt=_expiry_cutoff(),
+        ).delete()
+        active = active_uploads(recipe.user_id).count()
+        if active >= settings.IMAGE_UPLOAD_MAX_ACTIVE:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Too many unfinished uploads, finish or cancel one first.'
+            ]})
+        upload = ImageUpload.objects.create(
+            recipe=recipe, filename=filename, size=size,
+        )
+        path = part_path(upload)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'xb'):
+            pass
+
+    return upload
+
+
+def remove_expired_uploads():
+    """Remove expired sessions of all users and stray part files.
+
+    Part files without a session, left behind when a start was rolled
+    back, go once they are older than the expiry. Returns the number of
+    sessions and files removed.
+    """
+    cutoff = _expiry_cutoff()
+    sessions, _ = ImageUpload.objects.filter(created_at__lt=cutoff).delete()
+    directory = default_storage.path(os.path.join('uploads', 'partial'))
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+    known = {
+        str(upload_id) for upload_id in ImageUpload.objects.filter(
+            created_at__gte=cutoff,
+        ).values_list('id', flat=True)
+    }
+    files = 0
+    for name in set(names) - known:
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff.timestamp():
+                os.remove(path)
+                files += 1
+        except FileNotFoundError:
+            pass
+
+    return sessions, files
+
+
+def _copy(source, target, length):
+    copied = 0
+    while copied < length:
+        block = source.read(min(CHUNK_BUFFER_SIZE, length - copied))
+        if not block:
+            break
+        target.write(block)
+        copied += len(block)
+
+    return copied
+
+
+def write_chunk(upload, stream, start, length):
+    """Copy a chunk from stream into the part file, returning its length.
+
+    The chunk is spooled to an anonymous temporary file block by block
+    while the client sends it, holding no transaction or lock. Only the
+    local copy into the part file and the offset update run under the
+    session's row lock, which finalize takes too. Returns None, with the
+    session's current offset, if the chunk no longer continues the
+    received data. The offset only moves forward, so retried chunks
+    covering the same range are harmless; a chunk cut short still counts
+    up to the last byte received.
+    """
+    directory = os.path.dirname(part_path(upload))
+    with tempfile.TemporaryFile(dir=directory) as spool:
+        received = _copy(stream, spool, length)
+        spool.seek(0)
+        with transaction.atomic():
+            locked = ImageUpload.objects.select_for_update().filter(
+                id=upload.id, created_at__gte=_expiry_cutoff(),
+            ).first()
+            if locked is None:
+                raise NotFound()
+            upload.offset = locked.offset
+            if start > locked.offset:
+                return None
+            with _open_part(upload, 'r+b') as part:
+                part.seek(start)
+                _copy(spool, part, received)
+            ImageUpload.objects.filter(id=upload.id).update(
+                offset=Greatest('offset', start + received),
+            )
+            upload.refresh_from_db(fields=['offset'])
+
+    return received
+
+
+def part_checksum(upload):
+    """Return the hex SHA-256 digest of a part file, read block by block."""
+    digest = hashlib.sha256()
+    with _open_part(upload, 'rb') as part:
+        for block in iter(lambda: part.read(CHUNK_BUFFER_SIZE), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def finish_upload(upload, checksum):
+    """Verify a complete upload and make it the recipe's image.
+
+    Returns an error message, or None once the part file has been moved
+    into place and the session deleted. A checksum mismatch rewinds the
+    session so the client can send the file again. Must run in a
+    transaction, the variants of the old image go once it commits.
+    """
+    path = part_path(upload)
+    if not hmac.compare_digest(part_checksum(upload), checksum.lower()):
+        ImageUpload.objects.filter(id=upload.id).update(offset=0)
+        return 'Checksum does not match the uploaded data.'
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        upload.delete()
+        return 'Upload a valid image.'
+
+    recipe = upload.recipe
+    discard_image_variants(recipe.id)
+    name = recipe_image_file_path(recipe, upload.filename)
+    target = default_storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    recipe.image = name
+    recipe.image_variants = []
+    recipe.image_variants_failed = False
+    recipe.save(update_fields=[
+        'image', 'image_variants', 'image_variants_failed', 'updated_at',
+    ])
+    upload.delete()
+
+    return None
+
+
+def discard_part(upload):
+    """Remove the part file of an upload session if it still exists."""
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
@@ -19,5 +19,7 @@ router.register('ingredients', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('cache-stats/', views.cache_stats, name='cache-stats'),
+    path('changes/', views.changes, name='changes'),
     path('', include(router.urls))
 ]
@@ -1,6 +1,9 @@
 """
 Views for the recipe APIs.
 """
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -12,10 +15,16 @@ from rest_framework import (
     mixins,
     status,
 )
-from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.decorators import (
+    action,
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 
 from core.models import (
     Recipe,
@@ -23,57 +32,251 @@ from core.models import (
     Ingredient,
 )
 from recipe import serializers
+from recipe.bulk import BulkRecipeWriter
+from recipe.cache import (
+    CachedResponseMixin,
+    ConditionalListMixin,
+    ConditionalResponseMixin,
+    response_cache,
+)
+from recipe.export import (
+    iter_recipes,
+    present_recipe,
+    stream_csv,
+    stream_ndjson,
+    CSVRenderer,
+    NDJSONRenderer,
+)
+from recipe.facets import get_facets
+from recipe.images import discard_image_variants, schedule_image_variants
+from recipe.filters import (
+    filter_recipes,
+    params_to_ints,
+    param_to_count,
+    param_to_limit,
+    param_to_ordering,
+    rank_by_pantry,
+    search_recipes,
+    similar_recipes,
+    suggest_names,
+    ATTR_ORDERINGS,
+    FILTER_MODES,
+    MAX_PANTRY_IDS,
+    MAX_SUGGEST_LIMIT,
+    RECIPE_ORDERINGS,
+)
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination,
+)
+from recipe.shopping import get_shopping_list
+from recipe.sparse import SPARSE_PARAMETERS, SparseFieldsetMixin
+from recipe.sync import decode_token, get_changes
+from recipe.uploads import (
+    active_uploads,
+    finish_upload,
+    parse_content_range,
+    start_upload,
+    write_chunk,
+    ChunkParser,
+)
+
+
+UPLOAD_ID_PATTERN = r'(?P<upload_id>[0-9a-f-]{36})'
+
+
+RELATED_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='Comma separated list of IDs to filter'
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Comma separated list of ingredient IDs to filter'
+    ),
+    OpenApiParameter(
+        'tags_mode',
+        OpenApiTypes.STR, enum=FILTER_MODES,
+        description='Match any, all or none of the tags',
+    ),
+    OpenApiParameter(
+        'ingredients_mode',
+        OpenApiTypes.STR, enum=FILTER_MODES,
+        description='Match any, all or none of the ingredients',
+    ),
+]
+
+
+RANGE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'price_min',
+        OpenApiTypes.DECIMAL,
+        description='Only recipes costing at least this much',
+    ),
+    OpenApiParameter(
+        'price_max',
+        OpenApiTypes.DECIMAL,
+        description='Only recipes costing at most this much',
+    ),
+    OpenApiParameter(
+        'time_min',
+        OpenApiTypes.INT,
+        description='Only recipes taking at least this many minutes',
+    ),
+    OpenApiParameter(
+        'time_max',
+        OpenApiTypes.INT,
+        description='Only recipes taking at most this many minutes',
+    ),
+]
+
+
+FILTER_PARAMETERS = RELATED_FILTER_PARAMETERS + RANGE_FILTER_PARAMETERS
+
+
+SEARCH_PARAMETERS = [
+    OpenApiParameter(
+        'search',
+        OpenApiTypes.STR,
+        description='Full-text search, results ranked by relevance',
+    ),
+]
+
+
+ORDERING_PARAMETERS = [
+    OpenApiParameter(
+        'ordering',
+        OpenApiTypes.STR, enum=list(RECIPE_ORDERINGS),
+        description='Order by price, time or title instead of newest first',
+    ),
+]
 
 
 @extend_schema_view(
     list=extend_schema(
+        parameters=(
+            FILTER_PARAMETERS + SPARSE_PARAMETERS + SEARCH_PARAMETERS
+            + ORDERING_PARAMETERS
+        ),
+        responses=serializers.RecipeSerializer,
+    ),
+    retrieve=extend_schema(
+        parameters=SPARSE_PARAMETERS,
+        responses=serializers.RecipeDetailSerializer,
+    ),
+    export=extend_schema(
+        parameters=FILTER_PARAMETERS,
+        responses={
+            (200, NDJSONRenderer.media_type): OpenApiTypes.STR,
+            (200, CSVRenderer.media_type): OpenApiTypes.STR,
+        },
+    ),
+    pantry=extend_schema(
+        parameters=FILTER_PARAMETERS + [
+            OpenApiParameter(
+                'pantry',
+                OpenApiTypes.STR, required=True,
+                description='Comma separated list of ingredient IDs at hand',
+            ),
+            OpenApiParameter(
+                'max_missing',
+                OpenApiTypes.INT,
+                description='Only recipes missing at most this many',
+            ),
+        ],
+        responses=serializers.RecipeSerializer,
+    ),
+    facets=extend_schema(
+        parameters=FILTER_PARAMETERS + SEARCH_PARAMETERS,
+        responses=OpenApiTypes.OBJECT,
+    ),
+    shopping_list=extend_schema(
         parameters=[
             OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='Comma separated list of IDs to filter'
+                'recipes',
+                OpenApiTypes.STR, required=True,
+                description='Comma separated list of recipe IDs',
             ),
+        ],
+        responses=OpenApiTypes.OBJECT,
+    ),
+    similar=extend_schema(
+        parameters=[
             OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='Comma separated list of ingredient IDs to filter'
-            )
-        ]
-    )
+                'limit',
+                OpenApiTypes.INT,
+                description=f'Number of recipes, at most {MAX_SUGGEST_LIMIT}',
+            ),
+        ],
+        responses=serializers.RecipeSerializer(many=True),
+    ),
+    image_uploads=extend_schema(
+        responses={201: serializers.ImageUploadSerializer},
+    ),
+    image_upload=extend_schema(
+        methods=['PUT'],
+        parameters=[
+            OpenApiParameter(
+                'Content-Range',
+                OpenApiTypes.STR, OpenApiParameter.HEADER, required=True,
+                description='Byte range of the chunk: bytes start-end/size',
+            ),
+        ],
+        request={ChunkParser.media_type: OpenApiTypes.BINARY},
+        responses=serializers.ImageUploadSerializer,
+    ),
+    finalize_image_upload=extend_schema(
+        responses=serializers.RecipeImageSerializer,
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SparseFieldsetMixin,
+                    ConditionalResponseMixin,
+                    CachedResponseMixin,
+                    viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
-
-    def _params_to_ints(self, qs):
-        """Convert a list of strings to integers."""
-        return [int(str_id) for str_id in qs.split(',')]
+    pagination_class = RecipeCursorPagination
+    # Queries per request whatever the number of rows, token lookup included.
+    query_budgets = {'list': 4, 'retrieve': 5, 'facets': 4}
 
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-
-        return queryset.filter(
+        queryset = filter_recipes(self.queryset, self.request.query_params)
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by('-id')
+
+        search = self.request.query_params.get('search', '').strip()
+        if search:
+            queryset = search_recipes(queryset, search)
+        # An explicit ordering takes precedence over search relevance.
+        ordering = self.request.query_params.get('ordering')
+        if ordering:
+            queryset = queryset.order_by(*param_to_ordering(
+                'ordering', ordering, RECIPE_ORDERINGS,
+            ))
+
+        return self.prune_queryset(queryset, ('tags', 'ingredients'))
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
         if self.action == 'list':
-            return serializers.RecipeSerializer
+            return serializers.RecipeReadSerializer
+        elif self.action == 'retrieve':
+            return serializers.RecipeDetailReadSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action in ('image_uploads', 'image_upload'):
+            return serializers.ImageUploadSerializer
+        elif self.action == 'finalize_image_upload':
+            return serializers.ImageUploadFinalizeSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
 
         return self.serializer_class
 
@@ -88,43 +291,314 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                discard_image_variants(recipe.id)
+                recipe = serializer.save(
+                    image_variants=[], image_variants_failed=False,
+                )
+                schedule_image_variants(recipe)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _get_image_upload(self, pk, upload_id, lock=False):
+        uploads = active_uploads(self.request.user).select_related('recipe')
+        if lock:
+            uploads = uploads.select_for_update(of=('self',))
+
+        return get_object_or_404(uploads, recipe_id=pk, id=upload_id)
+
+    @action(methods=['POST'], detail=True, url_path='image-uploads')
+    def image_uploads(self, request, pk=None):
+        """Start a resumable chunked upload of the recipe image."""
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = start_upload(recipe, **serializer.validated_data)
+
+        return Response(
+            self.get_serializer(upload).data, status=status.HTTP_201_CREATED,
+        )
+
+    @action(
+        methods=['GET', 'PUT', 'DELETE'], detail=True,
+        url_path=f'image-uploads/{UPLOAD_ID_PATTERN}',
+        parser_classes=[ChunkParser],
+    )
+    def image_upload(self, request, pk=None, upload_id=None):
+        """Show, cancel or write a byte range of an image upload."""
+        if request.method == 'GET':
+            upload = self._get_image_upload(pk, upload_id)
+            return Response(self.get_serializer(upload).data)
+
+        if request.method == 'DELETE':
+            with transaction.atomic():
+                self._get_image_upload(pk, upload_id, lock=True).delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        return self._write_image_chunk(
+            request, self._get_image_upload(pk, upload_id),
+        )
+
+    def _write_image_chunk(self, request, upload):
+        chunk = parse_content_range(
+            request.headers.get('Content-Range'), upload.size,
+        )
+        if chunk is None:
+            return Response(
+                {'detail': 'Content-Range must be bytes start-end/size.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        start, length = chunk
+        if int(request.META.get('CONTENT_LENGTH') or 0) != length:
+            return Response(
+                {'detail': 'Content-Length must match the Content-Range.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Chunks must continue the received data, the offset says where.
+        if start > upload.offset:
+            return Response(
+                self.get_serializer(upload).data,
+                status=status.HTTP_409_CONFLICT,
+            )
+        written = write_chunk(upload, request.data, start, length)
+        if written is None:
+            return Response(
+                self.get_serializer(upload).data,
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return Response(
+            self.get_serializer(upload).data,
+            status=(
+                status.HTTP_200_OK if written == length
+                else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
+    @action(
+        methods=['POST'], detail=True,
+        url_path=f'image-uploads/{UPLOAD_ID_PATTERN}/finalize',
+    )
+    def finalize_image_upload(self, request, pk=None, upload_id=None):
+        """Check a complete upload's checksum and set it as the image."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            upload = self._get_image_upload(pk, upload_id, lock=True)
+            if upload.offset < upload.size:
+                return Response(
+                    serializers.ImageUploadSerializer(upload).data,
+                    status=status.HTTP_409_CONFLICT,
+                )
+            error = finish_upload(upload, serializer.validated_data['sha256'])
+            if error is not None:
+                return Response(
+                    {'detail': error}, status=status.HTTP_400_BAD_REQUEST,
+                )
+            schedule_image_variants(upload.recipe)
+
+        return Response(serializers.RecipeImageSerializer(
+            upload.recipe, context=self.get_serializer_context(),
+        ).data)
+
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Create, update and delete many recipes in one request."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        writer = BulkRecipeWriter(request)
+        result = writer.run(**serializer.validated_data)
+        if result is None:
+            return Response(
+                {'errors': writer.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+    )
+    def export(self, request):
+        """Stream all matching recipes as NDJSON or CSV."""
+        queryset = filter_recipes(
+            Recipe.objects.filter(user=request.user),
+            request.query_params,
+        ).order_by('id')
+        rows = (
+            present_recipe(row, request) for row in iter_recipes(queryset)
+        )
+        renderer = request.accepted_renderer
+        stream = stream_csv if renderer.format == 'csv' else stream_ndjson
+        response = StreamingHttpResponse(
+            stream(rows),
+            content_type=renderer.media_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{renderer.format}"'
+        )
+
+        return response
+
+    @action(methods=['GET'], detail=False)
+    def facets(self, request):
+        """Return tag, ingredient, price and time counts of the results."""
+        return self._cached_response(self._facets_response, request)
+
+    def _facets_response(self, request):
+        return Response(get_facets(self.filter_queryset(self.get_queryset())))
+
+    @action(methods=['GET'], detail=False)
+    def pantry(self, request):
+        """List recipes ranked by how much of them the pantry covers."""
+        value = request.query_params.get('pantry')
+        if not value:
+            return Response(
+                {'pantry': ['This query parameter is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = rank_by_pantry(
+            self.filter_queryset(self.get_queryset()),
+            params_to_ints('pantry', value, MAX_PANTRY_IDS),
+            param_to_count(
+                'max_missing', request.query_params.get('max_missing'),
+            ),
+        )
+
+        page = self.paginate_queryset(queryset)
+        data = serializers.RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context(),
+        ).data
+        for item, recipe in zip(data, page):
+            item['matched'] = recipe.matched
+            item['missing'] = recipe.missing
+
+        return self.get_paginated_response(data)
+
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """Merge the ingredients of many recipes into one list."""
+        return self._cached_response(self._shopping_list_response, request)
+
+    def _shopping_list_response(self, request):
+        value = request.query_params.get('recipes')
+        if not value:
+            return Response(
+                {'recipes': ['This query parameter is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=params_to_ints('recipes', value),
+        )
+
+        return Response(get_shopping_list(recipes))
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """List the recipes sharing most tags and ingredients with one."""
+        return self._cached_response(self._similar_response, request)
+
+    def _similar_response(self, request):
+        recipe = self.get_object()
+        similar = similar_recipes(
+            Recipe.objects.filter(user=request.user).prefetch_related(
+                'tags', 'ingredients',
+            ),
+            recipe,
+            param_to_limit('limit', request.query_params.get('limit')),
+        )
+        data = serializers.RecipeReadSerializer(
+            [item for item, _ in similar],
+            many=True,
+            context=self.get_serializer_context(),
+        ).data
+        for item, (_, similarity) in zip(data, similar):
+            item['similarity'] = round(similarity, 3)
+
+        return Response(data)
+
 
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
+        parameters=SPARSE_PARAMETERS + [
             OpenApiParameter(
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes',
-            )
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR, enum=list(ATTR_ORDERINGS),
+                description='Order by name or by number of recipes',
+            ),
         ]
-    )
+    ),
+    suggest=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR, required=True,
+                description='Name prefix or fuzzy text to match',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=f'Number of suggestions, at most '
+                            f'{MAX_SUGGEST_LIMIT}',
+            ),
+        ]
+    ),
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(SparseFieldsetMixin,
+                            ConditionalListMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for recipe attributes."""
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    query_budgets = {'list': 2}
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
         assigned_only = bool(
             int(self.request.query_params.get('assigned_only', 0))
         )
-        queryset = self.queryset
+        ordering = param_to_ordering(
+            'ordering',
+            self.request.query_params.get('ordering'),
+            ATTR_ORDERINGS,
+        )
+        queryset = self.queryset.filter(user=self.request.user)
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
 
-        return queryset.filter(
-            user=self.request.user
-            ).order_by('-name').distinct()
+        return self.prune_queryset(queryset.order_by(*ordering))
+
+    @action(methods=['GET'], detail=False)
+    def suggest(self, request):
+        """Suggest the user's names matching a prefix or fuzzy text."""
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response(
+                {'q': ['This query parameter is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = param_to_limit('limit', request.query_params.get('limit'))
+        queryset = suggest_names(
+            self.queryset.filter(user=self.request.user),
+            text,
+            limit,
+        )
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -137,3 +611,50 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database."""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Return recipe response cache statistics of this process."""
+    return Response(response_cache.get_stats())
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.STR,
+            description=(
+                'Token from the previous response, omit for a full sync. '
+                'While more is true it continues the current sync, 410 '
+                'means a full sync is required'
+            ),
+        ),
+    ]
+)
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def changes(request):
+    """Return a page of recipes, tags and ingredients changed since a token."""
+    since = request.query_params.get('since')
+    changed, deleted, next_token, more = get_changes(
+        request.user,
+        *(decode_token(since) if since else ()),
+    )
+    context = {'request': request}
+
+    return Response({
+        'recipes': serializers.RecipeDetailReadSerializer(
+            changed['recipes'], many=True, context=context,
+        ).data,
+        'tags': serializers.TagSerializer(changed['tags'], many=True).data,
+        'ingredients': serializers.IngredientSerializer(
+            changed['ingredients'], many=True,
+        ).data,
+        'deleted': deleted,
+        'next': next_token,
+        'more': more,
+    })
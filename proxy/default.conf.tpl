@@ -5,9 +5,18 @@ server {
         alias /vol/static;
     }
 
+    # Resumable image upload chunks stream through to the app as they
+    # arrive instead of being spooled to a temporary file first.
+    location ~ ^/api/recipe/recipes/[^/]+/image-uploads/ {
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+        client_max_body_size    10M;
+        uwsgi_request_buffering off;
+    }
+
     location / {
         uwsgi_pass           ${APP_HOST}:${APP_PORT};
         include              /etc/nginx/uwsgi_params;
         client_max_body_size 10M;
     }
-}
\ No newline at end of file
+}
@@ -5,5 +5,10 @@ set -e
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
+python manage.py clean_image_uploads
+python manage.py prune_tombstones
+
+# Backfill lost image variants alongside serving instead of before it.
+python manage.py render_image_variants &
 
 uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file